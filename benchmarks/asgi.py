@@ -0,0 +1,94 @@
+"""
+WSGI threads against ASGI coroutines for the busiest switch routes.
+
+Starts ``gunicorn dms.wsgi`` with ``--workers`` gthread workers of
+``--threads`` threads each and drives the DRF routes (``/api/...``), then
+starts ``uvicorn dms.asgi`` with the same number of workers and drives the
+async routes (``/api/async/...``). Each server gets the ``benchmarks.loadtest``
+scenario at every ``--concurrency`` level; the table shows throughput, tail
+latency and errors side by side. Needs ``pip install gunicorn uvicorn`` and
+accounts from ``manage.py seed_dms``:
+
+    python manage.py seed_dms --users 1000
+    python -m benchmarks.asgi dashboard-polling --concurrency 16 64 256 --duration 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks.loadtest import SCENARIOS, SEED_PASSWORD, run_scenario
+
+
+def server_commands(workers, threads, port):
+    bind = f'127.0.0.1:{port}'
+    return {
+        'wsgi': ('/api', [
+            sys.executable, '-m', 'gunicorn', 'dms.wsgi:application', '--bind', bind,
+            '--workers', str(workers), '--worker-class', 'gthread', '--threads', str(threads),
+        ]),
+        'asgi': ('/api/async', [
+            sys.executable, '-m', 'uvicorn', 'dms.asgi:application', '--host', '127.0.0.1',
+            '--port', str(port), '--workers', str(workers), '--no-access-log',
+        ]),
+    }
+
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with {process.returncode}")
+        try:
+            requests.get(f'{base_url}/metrics', timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start within {timeout}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenario', nargs='?', choices=sorted(SCENARIOS), default='dashboard-polling')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help="Threads per gunicorn worker")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--duration', type=float, default=20, help="Measured seconds per run")
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--first-user', type=int, default=1)
+    parser.add_argument('--password', default=SEED_PASSWORD)
+    args = parser.parse_args(argv)
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'dms.settings')}
+    rows = []
+    for server, (api_prefix, command) in server_commands(args.workers, args.threads, args.port).items():
+        process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(base_url, process)
+            for concurrency in args.concurrency:
+                report = run_scenario(
+                    base_url, args.scenario, concurrency, args.duration,
+                    args.accounts, args.first_user, args.password, args.warmup, api_prefix,
+                )
+                rows.append((server, concurrency, report['results']['total']))
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f"{args.scenario}, {args.workers} workers ({args.threads} threads each under WSGI)")
+    print(f"{'server':<8}{'concurrency':>12}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for server, concurrency, total in rows:
+        print(f"{server:<8}{concurrency:>12}{total['throughput_rps']:>10}{total['p50_ms']:>10}"
+              f"{total['p95_ms']:>10}{total['p99_ms']:>10}{total['errors']:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Connection-overhead benchmark for the check-in and list endpoints.
+
+Runs the endpoints in-process through Django's test client, once with a fresh
+connection per request (CONN_MAX_AGE=0) and once with a persistent connection.
+The test client disconnects ``close_old_connections`` from the
+request_started/request_finished signals, so each request is wrapped in the
+same calls the real handlers make. Use it against the real database profile:
+
+    DB_ENGINE=mysql python manage.py seed_dms --users 100
+    DB_ENGINE=mysql python -m benchmarks.connections --requests 500
+
+For an over-the-wire comparison, run benchmarks.loadtest against servers
+started with DB_CONN_MAX_AGE=0 and DB_CONN_MAX_AGE=60.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+
+def measure(client, method, path, count, headers):
+    from django.db import close_old_connections
+
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        close_old_connections()
+        response = getattr(client, method)(path, **headers)
+        close_old_connections()
+        timings.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise SystemExit(f"{method.upper()} {path} returned {response.status_code}")
+    timings.sort()
+    return {
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--persistent-age', type=int, default=60, help="CONN_MAX_AGE for the persistent run")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms.settings')
+    import django
+    django.setup()
+
+    from django.db import connections
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import AccessToken
+    from switch.models import Switch
+
+    switch = Switch.objects.select_related('user').order_by('id').first()
+    if switch is None:
+        raise SystemExit("No switches found; run `manage.py seed_dms` first")
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(switch.user)}'}
+    client = Client(HTTP_HOST='localhost')
+    endpoints = [
+        ('list', 'get', '/api/switches/'),
+        ('checkin', 'post', f'/api/switches/{switch.id}/checkin/'),
+    ]
+
+    settings_dict = connections['default'].settings_dict
+    engine = settings_dict['ENGINE'].rsplit('.', 1)[-1]
+    print(f"{engine}: {args.requests} requests per endpoint and mode")
+    print(f"{'endpoint':<10}{'mode':<22}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, method, path in endpoints:
+        for mode, max_age in (('per-request', 0), (f'persistent ({args.persistent_age}s)', args.persistent_age)):
+            connections['default'].close()
+            settings_dict['CONN_MAX_AGE'] = max_age
+            measure(client, method, path, 10, headers)  # warm up
+            result = measure(client, method, path, args.requests, headers)
+            print(f"{name:<10}{mode:<22}{result['mean_ms']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Template rendering benchmark for notification emails.
+
+Measures building trigger notification messages (subject, text and HTML
+parts) with nothing sent, so render cost can be tracked separately from SMTP:
+
+* ``cold`` - the template cache is cleared before every message, i.e. the
+  cost of compiling the templates each time
+* ``warm`` - compiled templates are reused from the LRU cache
+* ``batch`` - one ``build_messages`` call for the whole batch, as the sweep does
+
+    python -m benchmarks.email_render --messages 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--message-bytes', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms.settings_worker')
+    import django
+    django.setup()
+
+    from django.utils import timezone
+    from dms import emails
+
+    contexts = [
+        (f'recipient{index}@example.com', {
+            'title': f'Switch {index}',
+            'message': 'x' * args.message_bytes,
+            'inactivity_duration_days': 7,
+            'last_checkin': timezone.now(),
+        })
+        for index in range(args.messages)
+    ]
+
+    def cold():
+        for to, context in contexts:
+            emails.get_template.cache_clear()
+            emails.build_message('switch_triggered', context, [to])
+
+    def warm():
+        for to, context in contexts:
+            emails.build_message('switch_triggered', context, [to])
+
+    def batch():
+        emails.build_messages('switch_triggered', contexts)
+
+    print(f"{args.messages} messages")
+    print(f"{'mode':<8}{'total s':>10}{'per msg us':>12}")
+    warm()  # load the templates once so warm/batch start from a filled cache
+    for name, run in (('cold', cold), ('warm', warm), ('batch', batch)):
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        print(f"{name:<8}{elapsed:>10.3f}{elapsed / args.messages * 1e6:>12.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
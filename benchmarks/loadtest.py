@@ -0,0 +1,251 @@
+"""
+HTTP load-test harness for the DMS API.
+
+Drives the real routes (login, list switches, check-in, my-status) against a
+running server using accounts created by ``manage.py seed_dms`` and reports
+throughput and p50/p95/p99 latency per operation. Results are saved as JSON
+so runs can be compared across commits:
+
+    python manage.py seed_dms --users 1000
+    python manage.py runserver --noreload
+    python -m benchmarks.loadtest checkin-spike --concurrency 32 --duration 30
+    python -m benchmarks.loadtest --compare before.json after.json
+
+``--api-prefix /api/async`` drives the async switch routes instead; login
+always goes through ``/api/login/``.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+SEED_PASSWORD = 'seed-password-123'
+
+# Operation weights for each preset scenario
+SCENARIOS = {
+    # Everyone opens the app at the same time and checks in
+    'checkin-spike': {'checkin': 70, 'list': 15, 'my-status': 10, 'login': 5},
+    # Dashboards polling for countdowns and triggers
+    'dashboard-polling': {'list': 50, 'my-status': 50},
+    # Steady background mix
+    'mixed': {'list': 40, 'my-status': 25, 'checkin': 30, 'login': 5},
+    'login-storm': {'login': 100},
+}
+
+
+class VirtualUser:
+    """One seeded account with its own HTTP session and token"""
+
+    def __init__(self, base_url, email, password, api_prefix='/api'):
+        self.base_url = base_url.rstrip('/')
+        self.api_prefix = api_prefix.rstrip('/')
+        self.email = email
+        self.password = password
+        self.session = requests.Session()
+        self.switch_ids = []
+
+    def url(self, path):
+        return f'{self.base_url}{path}'
+
+    def login(self):
+        response = self.session.post(self.url('/api/login/'), json={
+            'email': self.email, 'password': self.password,
+        })
+        response.raise_for_status()
+        self.session.headers['Authorization'] = f"Bearer {response.json()['token']}"
+        return response
+
+    def list(self):
+        response = self.session.get(self.url(f'{self.api_prefix}/switches/'))
+        response.raise_for_status()
+        self.switch_ids = [switch['id'] for switch in response.json()]
+        return response
+
+    def checkin(self):
+        if not self.switch_ids:
+            return self.list()
+        switch_id = random.choice(self.switch_ids)
+        return self.session.post(self.url(f'{self.api_prefix}/switches/{switch_id}/checkin/'))
+
+    def my_status(self):
+        return self.session.get(self.url(f'{self.api_prefix}/my-status/'))
+
+    def run(self, operation):
+        return {
+            'login': self.login,
+            'list': self.list,
+            'checkin': self.checkin,
+            'my-status': self.my_status,
+        }[operation]()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    operations = {}
+    for operation, values in sorted(latencies.items()):
+        values.sort()
+        operations[operation] = {
+            'requests': len(values),
+            'errors': errors.get(operation, 0),
+            'throughput_rps': round(len(values) / elapsed, 2),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2),
+        }
+    everything = sorted(v for values in latencies.values() for v in values)
+    total = {
+        'requests': len(everything),
+        'errors': sum(errors.values()),
+        'throughput_rps': round(len(everything) / elapsed, 2),
+        'p50_ms': round((percentile(everything, 0.50) or 0) * 1000, 2),
+        'p95_ms': round((percentile(everything, 0.95) or 0) * 1000, 2),
+        'p99_ms': round((percentile(everything, 0.99) or 0) * 1000, 2),
+    }
+    return {'total': total, 'operations': operations}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(base_url, scenario, concurrency, duration, accounts, first_user, password, warmup, api_prefix='/api'):
+    weights = SCENARIOS[scenario]
+    operations, op_weights = zip(*weights.items())
+    users = [
+        VirtualUser(base_url, f'seed_user_{first_user + i}@example.com', password, api_prefix)
+        for i in range(accounts)
+    ]
+
+    # Every virtual user logs in and learns its switches before measuring
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda user: (user.login(), user.list()), users))
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    def worker(worker_id):
+        rng = random.Random(worker_id)
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                return
+            user = users[rng.randrange(len(users))]
+            operation = rng.choices(operations, op_weights)[0]
+            try:
+                failed = user.run(operation).status_code >= 400
+            except requests.RequestException:
+                failed = True
+            finished = time.perf_counter()
+            if started < measure_from:
+                continue
+            with lock:
+                latencies[operation].append(finished - started)
+                if failed:
+                    errors[operation] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+
+    return {
+        'scenario': scenario,
+        'weights': weights,
+        'base_url': base_url,
+        'api_prefix': api_prefix,
+        'concurrency': concurrency,
+        'duration_s': duration,
+        'accounts': accounts,
+        'commit': git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'results': summarize(latencies, errors, duration),
+    }
+
+
+def print_report(report):
+    results = report['results']
+    print(f"{report['scenario']} @ {report['concurrency']} concurrent, {report['duration_s']}s "
+          f"(commit {report['commit']})")
+    print(f"{'operation':<12}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(results['operations'].items()) + [('TOTAL', results['total'])]
+    for name, row in rows:
+        print(f"{name:<12}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>10}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    print(f"{before['scenario']}: {before['commit']} -> {after['commit']}")
+    print(f"{'operation':<12}{'metric':<16}{'before':>10}{'after':>10}{'change':>10}")
+    names = sorted(set(before['results']['operations']) | set(after['results']['operations']))
+    for name in names + ['TOTAL']:
+        old = before['results']['total'] if name == 'TOTAL' else before['results']['operations'].get(name)
+        new = after['results']['total'] if name == 'TOTAL' else after['results']['operations'].get(name)
+        if not old or not new:
+            continue
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0
+            print(f"{name:<12}{metric:<16}{old[metric]:>10}{new[metric]:>10}{change:>+9.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenario', nargs='?', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--api-prefix', default='/api', help="/api/async for the async switch routes")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=3, help="Unmeasured seconds before the run")
+    parser.add_argument('--accounts', type=int, default=100, help="Seeded accounts to spread load over")
+    parser.add_argument('--first-user', type=int, default=1, help="Id of the first seeded user")
+    parser.add_argument('--password', default=SEED_PASSWORD)
+    parser.add_argument('--output', help="JSON file for the results (default: loadtest-results/...)")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    report = run_scenario(
+        args.base_url, args.scenario, args.concurrency, args.duration,
+        args.accounts, args.first_user, args.password, args.warmup, args.api_prefix,
+    )
+    print_report(report)
+
+    output = args.output or os.path.join(
+        'loadtest-results', f"{args.scenario}-{report['commit'] or 'nocommit'}-{int(time.time())}.json"
+    )
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Saved {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
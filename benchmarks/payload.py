@@ -0,0 +1,84 @@
+"""
+Switch list payload benchmark: sparse fieldsets and response compression.
+
+For accounts with ``--sizes`` switches, requests ``GET /api/switches/``
+in-process through the full middleware stack, with every field and with
+``?fields=id,status,next_trigger_date``, uncompressed and with each encoding
+available (gzip, and brotli if installed). Reports the bytes on the wire and
+the median server time per request. Fixture accounts are written to the
+configured database and removed afterwards.
+
+    python -m benchmarks.payload --sizes 10 100 1000 --repeat 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+SPARSE = 'id,status,next_trigger_date'
+
+
+def measure(client, headers, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get('/api/switches/', params, **headers)
+        timings.append(time.perf_counter() - started)
+    assert response.status_code == 200, response.content
+    return len(response.content), statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms.settings')
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.utils import timezone
+    from rest_framework_simplejwt.tokens import AccessToken
+    from dms import compression
+    from switch.models import Action, Switch, SwitchPayload
+
+    encodings = ['identity', 'gzip'] + (['br'] if compression.brotli is not None else [])
+    client = Client()
+
+    print(f"{'switches':>9}{'fields':>8}{'encoding':>10}{'bytes':>10}{'ms':>9}")
+    with override_settings(ALLOWED_HOSTS=['testserver'], PROFILER_ENABLED=False):
+        for size in args.sizes:
+            user = get_user_model().objects.create_user(username=f'payload-benchmark-{os.getpid()}-{size}')
+            try:
+                Switch.objects.bulk_create(
+                    Switch(user=user, title=f'Switch {index}', inactivity_duration_days=7,
+                           last_checkin=timezone.now(), next_trigger_date=timezone.now())
+                    for index in range(size)
+                )
+                # MySQL does not return ids from bulk_create
+                switches = list(Switch.objects.filter(user=user))
+                SwitchPayload.objects.bulk_create(
+                    SwitchPayload(switch=switch, data=SwitchPayload.compress('Goodbye')) for switch in switches
+                )
+                Action.objects.bulk_create(
+                    Action(switch=switch, type='email', target='to@example.com') for switch in switches
+                )
+                auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+                for fields, params in (('all', {}), ('sparse', {'fields': SPARSE})):
+                    for encoding in encodings:
+                        headers = {**auth, 'HTTP_ACCEPT_ENCODING': encoding}
+                        size_bytes, seconds = measure(client, headers, params, args.repeat)
+                        print(f"{size:>9}{fields:>8}{encoding:>10}{size_bytes:>10}{seconds * 1000:>9.2f}")
+            finally:
+                user.delete()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
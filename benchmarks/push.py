@@ -0,0 +1,92 @@
+"""
+Event stream benchmark: memory per idle connection and publish latency.
+
+Opens ``--connections`` event streams against ``dms.push.events_app`` in one
+event loop, each for a different user, with the in-process broker and no
+network in between. Reports the memory held per idle connection and how long
+it takes until every stream has been sent one event published to its user.
+
+    python -m benchmarks.push --connections 20000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+
+async def run(args):
+    from rest_framework_simplejwt.tokens import AccessToken
+    from dms import push
+
+    class User:
+        def __init__(self, pk):
+            self.pk = self.id = pk
+
+    delivered = 0
+    all_delivered = asyncio.Event()
+    disconnect = asyncio.Event()
+
+    async def receive():
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal delivered
+        if message.get('body', b'').startswith(b'event:'):
+            delivered += 1
+            if delivered == args.connections:
+                all_delivered.set()
+
+    # Token creation is not part of the connection cost
+    scopes = [
+        {'type': 'http', 'path': push.EVENTS_PATH, 'headers': [],
+         'query_string': f'token={AccessToken.for_user(User(user_id))}'.encode()}
+        for user_id in range(1, args.connections + 1)
+    ]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    streams = [asyncio.ensure_future(push.events_app(scope, receive, send)) for scope in scopes]
+    while len(push.broker().subscribers) < args.connections:
+        await asyncio.sleep(0.01)
+    connected = time.perf_counter() - started
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for user_id in range(1, args.connections + 1):
+        push.publish(user_id, 'switch.checkin', switch_id=user_id)
+    await all_delivered.wait()
+    published = time.perf_counter() - started
+
+    disconnect.set()
+    await asyncio.gather(*streams)
+    return connected, held, published
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms.settings')
+    import django
+    django.setup()
+
+    from django.test.utils import override_settings
+    with override_settings(PUSH_BROKER_URL=''):
+        connected, held, published = asyncio.run(run(args))
+
+    print(f"{args.connections} connections")
+    print(f"connect        {connected:>10.3f} s")
+    print(f"memory/conn    {held / args.connections / 1024:>10.2f} KiB")
+    print(f"publish to all {published:>10.3f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
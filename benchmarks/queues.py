@@ -0,0 +1,153 @@
+"""
+Queue isolation benchmark: email latency while webhook receivers are slow.
+
+Queues a backlog of webhook deliveries against a receiver that takes
+``--webhook-latency`` seconds to answer, then a batch of email deliveries,
+and measures how long each email waits before it is sent. It runs twice with
+the same total worker concurrency:
+
+* ``shared`` - every task on Celery's default queue, one worker pool
+* ``routed`` - CELERY_TASK_ROUTES, with separate email and webhook pools
+
+Workers run in this process on Celery's in-memory broker against local SMTP
+and HTTP sinks, so no Redis or mail server is needed. Fixture deliveries are
+written to the configured database and removed afterwards.
+
+    python -m benchmarks.queues --webhooks 40 --emails 40 --webhook-latency 1
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from contextlib import ExitStack
+
+
+def wait_for(queryset, count, timeout):
+    deadline = time.monotonic() + timeout
+    while queryset.count() < count:
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Timed out waiting for {count} deliveries")
+        time.sleep(0.05)
+
+
+def run_mode(app, mode, args, email_ids, webhook_ids):
+    from celery.contrib.testing.worker import start_worker
+    from django.utils import timezone
+    from switch.models import Delivery, DeliveryStatus
+    from switch.tasks import deliver_email_lane, delivery_lanes
+
+    Delivery.objects.filter(id__in=email_ids + webhook_ids).update(
+        status=DeliveryStatus.PENDING, attempts=0, completed_at=None,
+    )
+    deliveries = Delivery.objects.filter(id__in=email_ids + webhook_ids).select_related('action')
+    lanes = delivery_lanes((delivery.id, delivery.action) for delivery in deliveries)
+    email_lanes = [lane for lane in lanes if lane[0] is deliver_email_lane]
+    webhook_lanes = [lane for lane in lanes if lane[0] is not deliver_email_lane]
+
+    if mode == 'shared':
+        # An explicit queue overrides CELERY_TASK_ROUTES
+        queue = app.conf.task_default_queue
+        pools = [([queue], args.concurrency)]
+    else:
+        queue = None
+        pools = [(['email'], args.email_concurrency), (['webhooks'], args.concurrency - args.email_concurrency)]
+
+    with ExitStack() as stack:
+        for queues, concurrency in pools:
+            stack.enter_context(start_worker(
+                app, concurrency=concurrency, pool='threads', queues=queues, perform_ping_check=False,
+            ))
+        # Webhooks first, as if left behind by an earlier sweep
+        for task, ids in webhook_lanes:
+            task.apply_async((ids,), queue=queue)
+        started = timezone.now()
+        for task, ids in email_lanes:
+            task.apply_async((ids,), queue=queue)
+
+        done = Delivery.objects.exclude(status=DeliveryStatus.PENDING)
+        wait_for(done.filter(id__in=email_ids), len(email_ids), args.timeout)
+        email_waits = sorted(
+            (completed_at - started).total_seconds()
+            for completed_at in done.filter(id__in=email_ids).values_list('completed_at', flat=True)
+        )
+        wait_for(done.filter(id__in=webhook_ids), len(webhook_ids), args.timeout)
+
+    return {
+        'email_p50': statistics.median(email_waits),
+        'email_max': email_waits[-1],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--webhooks', type=int, default=40)
+    parser.add_argument('--emails', type=int, default=40)
+    parser.add_argument('--webhook-latency', type=float, default=1.0, help="seconds the webhook sink takes to answer")
+    parser.add_argument('--concurrency', type=int, default=8, help="total worker threads in each mode")
+    parser.add_argument('--email-concurrency', type=int, default=2, help="threads given to the email queue when routed")
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms.settings_worker')
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from django.test.utils import override_settings
+    from django.utils import timezone
+    from switch.models import Action, Delivery, Switch
+    from switch.simulation import HttpSink, SmtpSink, _redirect_requests
+
+    with ExitStack() as stack:
+        # Must be in place before the Celery app first reads its configuration
+        stack.enter_context(override_settings(
+            CELERY_BROKER_URL='memory://',
+            CELERY_BROKER_TRANSPORT_OPTIONS={'polling_interval': 0.01},
+        ))
+        from dms.celery_app import app
+
+        smtp = stack.enter_context(SmtpSink())
+        http = stack.enter_context(HttpSink(latency=args.webhook_latency))
+        stack.enter_context(override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=smtp.port,
+            EMAIL_USE_SSL=False, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            DEFAULT_FROM_EMAIL='benchmark@example.com',
+            WEBHOOK_MAX_RETRIES=0,
+        ))
+        stack.enter_context(_redirect_requests(http.url))
+
+        user = get_user_model().objects.create_user(username=f'queue-benchmark-{os.getpid()}')
+        try:
+            switch = Switch.objects.create(
+                user=user, title='Queue benchmark', message='Benchmark', inactivity_duration_days=1,
+            )
+            actions = Action.objects.bulk_create(
+                [Action(switch=switch, type='email', target=f'bench{index}@example.com') for index in range(args.emails)]
+                # Distinct hosts, so the circuit breaker never opens
+                + [Action(switch=switch, type='webhook', target=f'https://slow{index}.example.com/hook')
+                   for index in range(args.webhooks)]
+            )
+            Delivery.objects.bulk_create(
+                Delivery(switch=switch, action=action, deadline=timezone.now()) for action in actions
+            )
+            kinds = dict(Delivery.objects.filter(switch=switch).values_list('id', 'action__type'))
+            email_ids = [delivery_id for delivery_id, kind in kinds.items() if kind == 'email']
+            webhook_ids = [delivery_id for delivery_id, kind in kinds.items() if kind == 'webhook']
+
+            print(f"{args.webhooks} webhooks at {args.webhook_latency}s, {args.emails} emails, "
+                  f"{args.concurrency} worker threads")
+            print(f"{'mode':<8}{'email wait p50 s':>18}{'email wait max s':>18}")
+            for mode in ('shared', 'routed'):
+                result = run_mode(app, mode, args, email_ids, webhook_ids)
+                print(f"{mode:<8}{result['email_p50']:>18.3f}{result['email_max']:>18.3f}")
+        finally:
+            user.delete()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Process startup benchmark for the web and worker settings profiles.
+
+For each profile this measures, in fresh interpreters:
+
+* ``check`` - ``manage.py check``
+* ``worker-boot`` - importing the Celery app and loading Django and the task
+  modules, which is what every worker process does before it can consume
+* ``first-task`` - boot plus running ``check_switches`` once in-process
+
+``--real-worker`` additionally starts ``celery worker`` and waits for it to
+report ready (needs a reachable broker).
+
+    python -m benchmarks.startup --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROFILES = ('dms.settings', 'dms.settings_worker')
+
+WORKER_BOOT = (
+    "from dms.celery_app import app; "
+    "app.loader.import_default_modules(); app.finalize()"
+)
+
+FIRST_TASK = WORKER_BOOT + "; from switch.tasks import check_switches; check_switches.apply()"
+
+
+def timed_run(command, profile):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': profile}
+    started = time.perf_counter()
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def real_worker_boot(profile, timeout=60):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': profile}
+    started = time.perf_counter()
+    worker = subprocess.Popen(
+        [sys.executable, '-m', 'celery', '-A', 'dms.celery_app', 'worker', '--pool=solo', '-l', 'info'],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        for line in worker.stdout:
+            if 'ready.' in line:
+                return time.perf_counter() - started
+            if time.perf_counter() - started > timeout:
+                break
+        raise RuntimeError("Celery worker did not become ready; is the broker running?")
+    finally:
+        worker.terminate()
+        worker.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--real-worker', action='store_true')
+    args = parser.parse_args(argv)
+
+    measurements = {
+        'check': lambda profile: timed_run([sys.executable, 'manage.py', 'check'], profile),
+        'worker-boot': lambda profile: timed_run([sys.executable, '-c', WORKER_BOOT], profile),
+        'first-task': lambda profile: timed_run([sys.executable, '-c', FIRST_TASK], profile),
+    }
+    if args.real_worker:
+        measurements['celery-ready'] = real_worker_boot
+
+    print(f"median of {args.repeat} runs, seconds")
+    print(f"{'measurement':<14}" + ''.join(f'{profile:>22}' for profile in PROFILES))
+    for name, measure in measurements.items():
+        medians = [statistics.median(measure(profile) for _ in range(args.repeat)) for profile in PROFILES]
+        print(f"{name:<14}" + ''.join(f'{median:>22.3f}' for median in medians))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,8 @@
 ASGI config for dms project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+``/api/events/`` is served by ``dms.push.events_app`` without going through
+Django, so long-lived event streams stay cheap; everything else is Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +15,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dms.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from dms.push import EVENTS_PATH, events_app  # noqa: E402  (needs settings)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+        return await events_app(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -1,8 +1,10 @@
 import os
 from celery import Celery
+from celery.signals import worker_init
 from django.conf import settings
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms.settings')
+# Workers and beat use the slimmer task-only profile
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dms.settings_worker')
 app = Celery('dms')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
@@ -13,4 +15,26 @@ app.conf.beat_schedule = {
         'task': 'switch.tasks.check_switches',
         'schedule': 3600,  # Every hour
     },
-}
\ No newline at end of file
+    'send-reminders': {
+        'task': 'switch.tasks.send_reminders',
+        'schedule': settings.REMINDER_INTERVAL_SECONDS,
+    },
+    'rollup-checkins-hourly': {
+        'task': 'switch.tasks.rollup_checkins',
+        'schedule': 3600,
+    },
+    'archive-switches-daily': {
+        'task': 'switch.tasks.archive_switches',
+        'schedule': 86400,
+    },
+    'purge-idempotency-keys-daily': {
+        'task': 'switch.tasks.purge_idempotency_keys',
+        'schedule': 86400,
+    },
+}
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    from dms.metrics import start_worker_server
+    start_worker_server()
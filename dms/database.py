@@ -0,0 +1,91 @@
+"""
+Database settings built from environment variables.
+
+``DB_ENGINE`` picks the backend profile (``mysql``, ``postgresql`` or
+``sqlite``); the remaining ``DB_*`` variables fill in credentials and the
+connection policy:
+
+* ``DB_CONN_MAX_AGE`` - seconds to keep a connection open between requests
+  and tasks (``0`` reconnects every time, ``none`` keeps it forever).
+* ``DB_CONN_HEALTH_CHECKS`` - ping persistent connections before reuse.
+* ``DB_REPLICA_HOSTS`` - comma separated read replicas that share the
+  primary's credentials; see ``dms.routers``.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+ENGINES = {
+    'mysql': 'django.db.backends.mysql',
+    'postgresql': 'django.db.backends.postgresql',
+    'sqlite': 'django.db.backends.sqlite3',
+}
+
+DEFAULT_PORTS = {
+    'mysql': '3306',
+    'postgresql': '5432',
+}
+
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _conn_max_age(value):
+    if value.strip().lower() == 'none':
+        return None
+    return int(value)
+
+
+def install_mysql_driver():
+    """Prefer the C mysqlclient driver and fall back to pure-Python PyMySQL"""
+    try:
+        import MySQLdb  # noqa: F401
+    except ImportError:
+        import pymysql
+        pymysql.install_as_MySQLdb()
+
+
+def database_config(base_dir, prefix='DB'):
+    """Return a DATABASES entry for the engine selected by ``<prefix>_ENGINE``"""
+    def env(name, default=None):
+        return os.getenv(f'{prefix}_{name}', default)
+
+    profile = env('ENGINE', 'mysql').lower()
+    if profile not in ENGINES:
+        raise ImproperlyConfigured(f"{prefix}_ENGINE must be one of {', '.join(ENGINES)}, not {profile!r}")
+
+    if profile == 'sqlite':
+        return {
+            'ENGINE': ENGINES[profile],
+            'NAME': env('NAME') or str(base_dir / 'db.sqlite3'),
+            # Connections are local file handles; keeping them costs nothing
+            'CONN_MAX_AGE': _conn_max_age(env('CONN_MAX_AGE', 'none')),
+        }
+
+    if profile == 'mysql':
+        install_mysql_driver()
+
+    return {
+        'ENGINE': ENGINES[profile],
+        'NAME': env('NAME'),
+        'USER': env('USER'),
+        'PASSWORD': env('PASSWORD'),
+        'HOST': env('HOST', 'localhost'),
+        'PORT': env('PORT', DEFAULT_PORTS[profile]),
+        'CONN_MAX_AGE': _conn_max_age(env('CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': env_bool(f'{prefix}_CONN_HEALTH_CHECKS', True),
+    }
+
+
+def replica_configs(primary, prefix='DB'):
+    """Return ``replica_N`` DATABASES entries for each host in ``<prefix>_REPLICA_HOSTS``"""
+    hosts = [host.strip() for host in os.getenv(f'{prefix}_REPLICA_HOSTS', '').split(',') if host.strip()]
+    if hosts and primary['ENGINE'] == ENGINES['sqlite']:
+        raise ImproperlyConfigured("Read replicas are not supported with the sqlite profile")
+    return {
+        f'replica_{index}': {**primary, 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+        for index, host in enumerate(hosts)
+    }
+
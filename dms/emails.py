@@ -0,0 +1,69 @@
+"""
+Templated notification emails.
+
+Each email ``<name>`` is built from three templates in ``dms/templates/emails``:
+``<name>_subject.txt``, ``<name>.txt`` and optionally ``<name>.html``. They are
+compiled once per process by standalone template engines (so the slim worker
+settings, which have no TEMPLATES, can use them too) and kept in an LRU cache
+of ``EMAIL_TEMPLATE_CACHE_SIZE`` compiled templates.
+
+``.txt`` templates are rendered without autoescaping; ``.html`` with it.
+"""
+
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template import Context, Engine, TemplateDoesNotExist
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates' / 'emails'
+
+# Plain filesystem loaders: get_template's LRU is the only template cache
+_LOADERS = ['django.template.loaders.filesystem.Loader']
+_engines = {
+    'txt': Engine(dirs=[str(TEMPLATE_DIR)], loaders=_LOADERS, autoescape=False),
+    'html': Engine(dirs=[str(TEMPLATE_DIR)], loaders=_LOADERS, autoescape=True),
+}
+
+
+@lru_cache(maxsize=getattr(settings, 'EMAIL_TEMPLATE_CACHE_SIZE', 32))
+def get_template(filename):
+    """Compiled template for ``filename``, or None if it does not exist"""
+    try:
+        return _engines[filename.rsplit('.', 1)[-1]].get_template(filename)
+    except TemplateDoesNotExist:
+        return None
+
+
+def _render(filename, context):
+    template = get_template(filename)
+    if template is None:
+        return None
+    return template.render(Context(context, autoescape=template.engine.autoescape))
+
+
+def render_email(name, context):
+    """Return ``(subject, text, html)`` for the email ``name``; html may be None"""
+    subject = _render(f'{name}_subject.txt', context)
+    text = _render(f'{name}.txt', context)
+    html = _render(f'{name}.html', context)
+    # Subjects must be a single line
+    return ' '.join(subject.split()), text, html
+
+
+def build_message(name, context, to, connection=None):
+    subject, text, html = render_email(name, context)
+    message = EmailMultiAlternatives(subject, text, settings.DEFAULT_FROM_EMAIL, to, connection=connection)
+    if html is not None:
+        message.attach_alternative(html, 'text/html')
+    return message
+
+
+def build_messages(name, recipients_and_contexts, connection=None):
+    """Render a batch of the same email, e.g. one sweep's worth of trigger notifications"""
+    return [build_message(name, context, [to], connection) for to, context in recipients_and_contexts]
+
+
+def send_email(name, context, to):
+    return build_message(name, context, to).send()
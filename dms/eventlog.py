@@ -0,0 +1,117 @@
+"""
+Structured, non-blocking event logging.
+
+``log_event('switch.triggered', switch_id=switch.id)`` emits a record on the
+``dms.events`` logger. Records are handed to ``QueueingHandler``, which only
+enqueues them; a background thread turns them into JSON lines and does the
+I/O, so hot loops never format or write log output themselves.
+
+Field values are rendered lazily on that background thread: callables are
+called and anything else is converted with ``str()`` when the line is
+written. Pass plain values, exceptions or callables that do not touch the
+database.
+
+``LOG_EVENT_SAMPLE_RATES`` maps an event name (or its prefix before the first
+dot) to the fraction of events that are kept, e.g. ``{'switch.checkin': 0.1}``.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+events_logger = logging.getLogger('dms.events')
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _sample_rate(event):
+    rates = getattr(settings, 'LOG_EVENT_SAMPLE_RATES', None)
+    if not rates:
+        return 1.0
+    return rates.get(event, rates.get(event.split('.', 1)[0], 1.0))
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """Log a structured event, subject to its sampling rate"""
+    if not events_logger.isEnabledFor(level):
+        return
+    rate = _sample_rate(event)
+    if rate < 1 and random.random() >= rate:
+        return
+    events_logger.log(level, event, extra={'event': event, 'fields': fields, 'sample_rate': rate})
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; evaluates lazy event fields"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        event = getattr(record, 'event', None)
+        if event is not None:
+            payload['event'] = event
+            for name, value in record.fields.items():
+                payload[name] = value() if callable(value) else value
+            if record.sample_rate < 1:
+                payload['sample_rate'] = record.sample_rate
+        else:
+            payload['message'] = record.getMessage()
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=_json_default)
+
+
+class QueueingHandler(QueueHandler):
+    """Enqueues records for a background thread that formats and writes them"""
+
+    def __init__(self, stream=None, maxsize=10000):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.target.setFormatter(JsonFormatter())
+        super().__init__(queue.Queue(maxsize))
+        self._start()
+        # Forked workers (Celery prefork) do not inherit the listener thread
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self.queue = queue.Queue(self.maxsize)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def prepare(self, record):
+        # Unlike QueueHandler, leave formatting to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block the caller on logging
+            self.dropped += 1
+
+    def flush(self):
+        """Wait until everything queued so far has been written"""
+        self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
@@ -0,0 +1,60 @@
+"""
+Sparse fieldsets: ``?fields=id,status,next_trigger_date`` on a GET request.
+
+``SparseFieldsMixin`` drops every other field from a serializer, and
+``model_columns`` turns the requested fields into the column list for
+``QuerySet.only()``, so unrequested columns are neither read nor serialized.
+Views decide themselves which relations to prefetch (see ``wants_any``).
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+PARAM = 'fields'
+
+
+def requested_fields(request):
+    """The set of field names asked for with ``?fields=``, or None for all of them"""
+    if request is None or request.method != 'GET':
+        return None
+    # request.GET works for both Django and DRF requests
+    value = request.GET.get(PARAM)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def wants_any(request, *names):
+    fields = requested_fields(request)
+    return fields is None or not fields.isdisjoint(names)
+
+
+def model_columns(serializer_class, fields):
+    """Concrete model fields the serializer reads to render ``fields``"""
+    model = serializer_class.Meta.model
+    columns = {model._meta.pk.name}
+    for name, field in serializer_class().fields.items():
+        if name not in fields:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if model_field.concrete:
+            columns.add(model_field.name)
+    return columns
+
+
+class SparseFieldsMixin:
+    """Serializer mixin limiting the output to the fields named in ``?fields=``"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is None:
+            return
+        unknown = fields - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({PARAM: f"Unknown fields: {', '.join(sorted(unknown))}."})
+        for name in set(self.fields) - fields:
+            self.fields.pop(name)
@@ -0,0 +1,123 @@
+"""
+Prometheus metrics for the sweep, action deliveries and API hot paths.
+
+Metrics are only recorded when ``METRICS_ENABLED`` is set and
+``prometheus_client`` is installed. Otherwise every metric below is a shared
+no-op object, so instrumented code pays for one method call and nothing else.
+"""
+
+import os
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover - optional dependency
+    prometheus_client = None
+
+
+ENABLED = bool(getattr(settings, 'METRICS_ENABLED', False)) and prometheus_client is not None
+
+
+class _NoopMetric:
+    """Stands in for any prometheus metric when metrics are disabled"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+
+_NOOP = _NoopMetric()
+
+
+def _metric(kind, name, documentation, **kwargs):
+    if not ENABLED:
+        return _NOOP
+    return getattr(prometheus_client, kind)(name, documentation, **kwargs)
+
+
+SWEEP_DURATION = _metric(
+    'Histogram', 'dms_sweep_duration_seconds',
+    'Wall time of one check_switches run',
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 1800, 3600),
+)
+SWITCHES_OVERDUE = _metric(
+    'Gauge', 'dms_switches_overdue',
+    'Due switches processed by the last sweep',
+)
+SWEEP_LAG_SECONDS = _metric(
+    'Gauge', 'dms_sweep_lag_seconds',
+    'How far past its deadline the first switch the last sweep left unprocessed was (0 when it caught up)',
+)
+SWITCHES_TRIGGERED = _metric(
+    'Counter', 'dms_switches_triggered_total',
+    'Switches marked as triggered by the sweep',
+)
+DELIVERY_DURATION = _metric(
+    'Histogram', 'dms_delivery_duration_seconds',
+    'Time spent delivering a single action',
+    labelnames=['action_type'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DELIVERY_FAILURES = _metric(
+    'Counter', 'dms_delivery_failures_total',
+    'Action deliveries that raised an error',
+    labelnames=['action_type'],
+)
+CHECKINS = _metric(
+    'Counter', 'dms_checkins_total',
+    'Successful switch check-ins',
+)
+# Webhook hosts are user supplied, so they are not used as labels; per-host
+# state is served by /api/webhook-circuits/
+WEBHOOK_CIRCUIT_TRIPS = _metric(
+    'Counter', 'dms_webhook_circuit_trips_total',
+    'Times a webhook host circuit breaker opened',
+)
+WEBHOOK_CIRCUIT_REJECTED = _metric(
+    'Counter', 'dms_webhook_circuit_rejected_total',
+    'Webhook deliveries failed fast because their host circuit was open',
+)
+
+
+def _registry():
+    """Collect from every process when running under a multiprocess server"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def metrics_view(request):
+    """Expose metrics in the Prometheus text format"""
+    if not ENABLED:
+        return HttpResponseNotFound()
+    return HttpResponse(
+        prometheus_client.generate_latest(_registry()),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
+
+
+def start_worker_server(**kwargs):
+    """Serve metrics from a Celery worker on METRICS_WORKER_PORT"""
+    port = getattr(settings, 'METRICS_WORKER_PORT', None)
+    if ENABLED and port:
+        prometheus_client.start_http_server(int(port), registry=_registry())
@@ -0,0 +1,210 @@
+"""
+Per-request profiling.
+
+``RequestProfilerMiddleware`` records the SQL query count and time, the time
+spent in serializers and the time spent in the view for every request. The
+numbers are returned as a ``Server-Timing`` header and logged as a
+``request.profile`` event.
+
+A full cProfile run is taken for a sampled fraction of requests
+(``PROFILER_SAMPLE_RATE``) or when the request carries an ``X-Profile`` header
+matching ``PROFILER_HEADER_TOKEN``. Profiles are written to
+``PROFILER_OUTPUT_DIR`` and can be opened with ``pstats`` or snakeviz.
+
+The middleware runs natively under ASGI as well, so async views are not moved
+to a thread. A cProfile run there also covers whatever else the event loop
+runs while the request is in flight.
+"""
+
+import cProfile
+import os
+import random
+import re
+import secrets
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from dms.eventlog import log_event
+
+_current_profile = ContextVar('dms_request_profile', default=None)
+
+
+class RequestProfile:
+    """Timings collected while a single request is being handled"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.view_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a database execute_wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def _record_query(execute, sql, params, many, context):
+    """Execute wrapper adding the query to the profile of the request being handled, if any"""
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def _instrument_connections():
+    # Connections are per thread, and under ASGI queries run in a different
+    # thread than the middleware, so the wrapper is installed once and stays
+    for connection in connections.all():
+        if _record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_record_query)
+
+
+def _mark_view_started():
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.view_started = time.perf_counter()
+
+
+def _timed(method_name):
+    def method(self, *args, **kwargs):
+        profile = _current_profile.get()
+        parent = getattr(super(ProfiledSerializerMixin, self), method_name)
+        if profile is None:
+            return parent(*args, **kwargs)
+
+        # Only the outermost serializer call counts, so nesting is not double counted
+        profile.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return parent(*args, **kwargs)
+        finally:
+            profile.serializer_depth -= 1
+            if profile.serializer_depth == 0:
+                profile.serializer_time += time.perf_counter() - started
+
+    method.__name__ = method_name
+    return method
+
+
+class ProfiledSerializerMixin:
+    """Adds serializer validation and rendering time to the request profile"""
+
+    to_representation = _timed('to_representation')
+    run_validation = _timed('run_validation')
+
+
+class RequestProfilerMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILER_ENABLED', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'PROFILER_SAMPLE_RATE', 0))
+        self.header_token = getattr(settings, 'PROFILER_HEADER_TOKEN', '')
+        self.output_dir = getattr(settings, 'PROFILER_OUTPUT_DIR', 'profiles')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # A sync process_view would cost a thread switch per request
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _instrument_connections()
+        profile = RequestProfile()
+        context_token = _current_profile.set(profile)
+        profiler = cProfile.Profile() if self._should_profile(request) else None
+        started = time.perf_counter()
+
+        try:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        finally:
+            _current_profile.reset(context_token)
+        return self._finish(request, response, profile, profiler, started)
+
+    async def __acall__(self, request):
+        # The ORM runs this request's queries in its own thread
+        await sync_to_async(_instrument_connections)()
+        profile = RequestProfile()
+        context_token = _current_profile.set(profile)
+        profiler = cProfile.Profile() if self._should_profile(request) else None
+        started = time.perf_counter()
+
+        try:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        finally:
+            _current_profile.reset(context_token)
+        return self._finish(request, response, profile, profiler, started)
+
+    def _finish(self, request, response, profile, profiler, started):
+        """Adds the Server-Timing header and logs the profile"""
+        finished = time.perf_counter()
+        timings = {
+            'total': finished - started,
+            'db': profile.db_time,
+            'serializer': profile.serializer_time,
+        }
+        if profile.view_started is not None:
+            timings['view'] = finished - profile.view_started
+
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()
+        ) + f', queries;desc="{profile.queries}"'
+
+        profile_path = self._dump(profiler, request) if profiler is not None else None
+        log_event(
+            'request.profile',
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            queries=profile.queries,
+            profile=profile_path,
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in timings.items()},
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _mark_view_started()
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        _mark_view_started()
+
+    def _should_profile(self, request):
+        header = request.headers.get('X-Profile')
+        if header and self.header_token and secrets.compare_digest(header.encode(), self.header_token.encode()):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _dump(self, profiler, request):
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+        path = os.path.join(
+            self.output_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{slug}-{secrets.token_hex(4)}.prof'
+        )
+        profiler.dump_stats(path)
+        return path
@@ -0,0 +1,196 @@
+"""
+Server-sent events pushing switch status changes to connected clients.
+
+``publish(user_id, 'switch.checkin', switch_id=...)`` sends an event to every
+open ``GET /api/events/`` stream of that user. ``dms.asgi`` routes that path
+straight to ``events_app``, a bare ASGI app that skips Django's request
+handling and middleware, so an idle connection only costs a coroutine and a
+small queue. Streams authenticate with the usual access token, in the
+``Authorization`` header or, for ``EventSource``, as ``?token=``, and end when
+it expires.
+
+``PUSH_BROKER_URL`` (``redis://...``, by default ``REDIS_URL``) carries events
+between processes over Redis pub/sub: each web process holds one pattern
+subscription and fans events out to its own streams. Set empty, events only
+reach streams in the publishing process, which is enough for tests and a
+single process setup but loses everything published by Celery workers.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/api/events/'
+CHANNEL_PREFIX = 'dms:events:'
+
+
+def _offer(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # A client that stopped reading loses events rather than memory
+        pass
+
+
+class MemoryBroker:
+    """Delivers events to the streams open in this process"""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+
+    def publish(self, user_id, message):
+        self.deliver(str(user_id), message)
+
+    def deliver(self, user_id, message):
+        # Safe to call from any thread: queues are only touched on their own loop
+        for loop, queue in list(self.subscribers.get(user_id, ())):
+            loop.call_soon_threadsafe(_offer, queue, message)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        queue = asyncio.Queue(settings.PUSH_QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue)
+        subscribers = self.subscribers[str(user_id)]
+        subscribers.add(entry)
+        try:
+            yield queue
+        finally:
+            subscribers.discard(entry)
+            if not subscribers:
+                self.subscribers.pop(str(user_id), None)
+
+
+class RedisBroker(MemoryBroker):
+    """Publishes through Redis; one pattern subscription per process feeds the local streams"""
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.client = None
+        self.listener = None
+
+    def publish(self, user_id, message):
+        import redis
+        if self.client is None:
+            self.client = redis.Redis.from_url(self.url)
+        self.client.publish(f'{CHANNEL_PREFIX}{user_id}', message)
+
+    async def listen(self):
+        import redis
+        import redis.asyncio
+        while True:
+            client = redis.asyncio.Redis.from_url(self.url)
+            try:
+                async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                    async for item in pubsub.listen():
+                        user_id = item['channel'].decode()[len(CHANNEL_PREFIX):]
+                        self.deliver(user_id, item['data'].decode())
+            except redis.RedisError:
+                logger.warning("Push subscription lost, reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                await client.aclose()
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(self.listen())
+        async with super().subscribe(user_id) as queue:
+            yield queue
+
+
+@lru_cache(maxsize=None)
+def broker():
+    url = settings.PUSH_BROKER_URL
+    return RedisBroker(url) if url else MemoryBroker()
+
+
+def publish(user_id, event, **data):
+    """Push ``event`` to the user's open streams; never raises"""
+    # Encoded once here rather than once per stream
+    data = json.dumps({'event': event, **data}, cls=DjangoJSONEncoder)
+    message = f'event: {event}\ndata: {data}\n\n'
+    try:
+        broker().publish(user_id, message)
+    except Exception:
+        logger.warning("Could not publish %s", event, exc_info=True)
+
+
+def authenticate(scope):
+    """``(user id, token expiry)`` for the access token sent with the request, or None"""
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    raw = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization' and value.startswith(b'Bearer '):
+            raw = value[len(b'Bearer '):].decode()
+    if not raw:
+        return None
+    try:
+        token = AccessToken(raw)
+    except TokenError:
+        return None
+    return token[api_settings.USER_ID_CLAIM], token['exp']
+
+
+async def _disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def events_app(scope, receive, send):
+    """ASGI app serving the event stream"""
+    identity = authenticate(scope)
+    if identity is None:
+        await send({'type': 'http.response.start', 'status': 401, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'Authentication required'})
+        return
+    user_id, expires = identity
+
+    headers = [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        # Stops nginx from buffering the stream
+        (b'x-accel-buffering', b'no'),
+    ]
+    if settings.CORS_ALLOW_ALL_ORIGINS:
+        headers.append((b'access-control-allow-origin', b'*'))
+
+    async with broker().subscribe(user_id) as queue:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+        disconnected = asyncio.ensure_future(_disconnect(receive))
+        try:
+            while not disconnected.done():
+                remaining = expires - time.time()
+                if remaining <= 0:
+                    break
+                message = asyncio.ensure_future(queue.get())
+                await asyncio.wait(
+                    {message, disconnected}, timeout=min(settings.PUSH_HEARTBEAT_SECONDS, remaining),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if message.done():
+                    body = message.result().encode()
+                else:
+                    message.cancel()
+                    body = b': keepalive\n\n'
+                if not disconnected.done():
+                    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
@@ -0,0 +1,126 @@
+"""
+Primary/replica database routing.
+
+Reads go to a random ``replica_*`` database and writes to ``default``. A
+request that writes, and every request from the same client for
+``REPLICA_STICKY_SECONDS`` afterwards, is pinned to the primary so users never
+read a replica that has not caught up with their own check-in or edit.
+
+Outside a request nothing pins automatically: reads only go to the primary
+inside a transaction on it, or for objects related to an instance loaded
+from it. Celery tasks and management commands that read rows they (or the
+task that queued them) just wrote must use ``use_primary()`` or
+``.using(PRIMARY)``.
+"""
+
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+PRIMARY = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_pinned = ContextVar('dms_pinned_to_primary', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def replica_alias():
+    """A replica to read from, or the primary if none are configured or reads are pinned"""
+    replicas = replica_aliases()
+    if _pinned.get() or not replicas:
+        return PRIMARY
+    return random.choice(replicas)
+
+
+@contextmanager
+def use_primary():
+    """Send every read in the block to the primary"""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # A transaction must see its own writes, and so must relations of a primary row
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == PRIMARY:
+            return PRIMARY
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaStickinessMiddleware:
+    """Pins writes, and reads shortly after a client's last write, to the primary"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = self._client_key(request)
+        writes = request.method not in SAFE_METHODS
+        pinned = writes or (key is not None and cache.get(key) is not None)
+
+        token = _pinned.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+        if writes and key is not None and response.status_code < 400:
+            cache.set(key, 1, self.sticky_seconds)
+        return response
+
+    async def __acall__(self, request):
+        key = self._client_key(request)
+        writes = request.method not in SAFE_METHODS
+        pinned = writes or (key is not None and await cache.aget(key) is not None)
+
+        # Queries of async views inherit the pin through the context
+        token = _pinned.set(pinned)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+        if writes and key is not None and response.status_code < 400:
+            await cache.aset(key, 1, self.sticky_seconds)
+        return response
+
+    def _client_key(self, request):
+        credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not credential:
+            return None
+        return 'replica-pin:' + hashlib.sha256(credential.encode()).hexdigest()
@@ -14,8 +14,7 @@ from pathlib import Path
 from datetime import timedelta
 import os
 from dotenv import load_dotenv
-import pymysql
-pymysql.install_as_MySQLdb()
+from dms.database import database_config, replica_configs
 
 
 load_dotenv()
@@ -54,6 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "dms.profiling.RequestProfilerMiddleware",
+    "dms.routers.ReplicaStickinessMiddleware",
+    "dms.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -89,16 +91,39 @@ WSGI_APPLICATION = "dms.wsgi.application"
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
 
+# DB_ENGINE selects mysql (default), postgresql or sqlite; see dms/database.py
+# for the connection persistence variables.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': os.getenv('DB_NAME'),
-        'USER': os.getenv('DB_USER'),
-        'PASSWORD': os.getenv('DB_PASSWORD'),
-        'HOST': 'localhost',   # Or an IP Address that your DB is hosted on
-        'PORT': '3306',
-    }
+    'default': database_config(BASE_DIR),
 }
+DATABASES.update(replica_configs(DATABASES['default']))
+
+# Reads go to replicas (when DB_REPLICA_HOSTS is set) except for clients that
+# wrote within the last REPLICA_STICKY_SECONDS; see dms/routers.py.
+DATABASE_ROUTERS = ['dms.routers.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# Redis is the Celery broker, so every deployment already has it
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# Shared cache for state that must be visible to every web and worker process:
+# sweep lock and checkpoint, circuit breakers, idempotency locks and replica
+# pins. Defaults to REDIS_URL; an empty CACHE_URL gives each process its own
+# in-memory cache, which is only safe with a single process (tests, local runs).
+CACHE_URL = os.getenv('CACHE_URL', REDIS_URL)
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 
 # Password validation
@@ -125,7 +150,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 LANGUAGE_CODE = "en-us"
 
-TIME_ZONE = "Africa/lagos"
+TIME_ZONE = "Africa/Lagos"
 
 USE_I18N = False
 
@@ -159,11 +184,130 @@ SIMPLE_JWT = {
 
 CORS_ALLOW_ALL_ORIGINS = True
 
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
-CELERY_TIMEZONE = 'Africa/lagos'
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_TIMEZONE = 'Africa/Lagos'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Sweeps, email and webhook delivery each get their own queue so a worker pool
+# can be sized for each (see the README). Nothing reads task results, so they
+# are not stored.
+CELERY_TASK_ROUTES = {
+    'switch.tasks.check_switches': {'queue': 'sweeps'},
+    'switch.tasks.send_reminders': {'queue': 'sweeps'},
+    'switch.tasks.purge_idempotency_keys': {'queue': 'sweeps'},
+    'switch.tasks.rollup_checkins': {'queue': 'sweeps'},
+    'switch.tasks.archive_switches': {'queue': 'sweeps'},
+    'switch.tasks.deliver_email_lane': {'queue': 'email'},
+    'switch.tasks.deliver_reminder_lane': {'queue': 'email'},
+    'switch.tasks.deliver_webhook_lane': {'queue': 'webhooks'},
+}
+CELERY_TASK_IGNORE_RESULT = True
+# Long webhook tasks should not be reserved by a busy process while others idle
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', '1'))
+
+# check_switches holds a cache lock so sweeps never overlap, processes due
+# switches in chunks and stops after the time or row budget, saving a
+# checkpoint that the next sweep resumes from.
+SWEEP_TIME_BUDGET_SECONDS = int(os.getenv('SWEEP_TIME_BUDGET_SECONDS', '3000'))
+SWEEP_ROW_BUDGET = int(os.getenv('SWEEP_ROW_BUDGET', '100000'))
+SWEEP_CHUNK_SIZE = int(os.getenv('SWEEP_CHUNK_SIZE', '500'))
+SWEEP_LOCK_SECONDS = int(os.getenv('SWEEP_LOCK_SECONDS', '900'))
+
+# Responses to API calls sent with an Idempotency-Key header are replayed for
+# repeats of the same key within this many seconds (switch/idempotency.py).
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+
+# Rows fetched and encoded per chunk by the streaming /api/export/ endpoints
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# rollup_checkins fills in per-day check-in counts for the history endpoint;
+# a backlog is caught up at most this many days per run.
+CHECKIN_ROLLUP_MAX_DAYS = int(os.getenv('CHECKIN_ROLLUP_MAX_DAYS', '31'))
+
+# archive_switches moves switches triggered more than ARCHIVE_AFTER_DAYS ago
+# to the archive tables, ARCHIVE_BATCH_SIZE per transaction and at most
+# ARCHIVE_MAX_BATCHES batches per run.
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '30'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_MAX_BATCHES = int(os.getenv('ARCHIVE_MAX_BATCHES', '20'))
+
+# Status events for /api/events/ (dms/push.py) travel over Redis pub/sub, since
+# Celery workers publish most of them. An empty PUSH_BROKER_URL keeps them in
+# the publishing process, which is only enough for tests and single process runs.
+PUSH_BROKER_URL = os.getenv('PUSH_BROKER_URL', REDIS_URL)
+PUSH_HEARTBEAT_SECONDS = int(os.getenv('PUSH_HEARTBEAT_SECONDS', '15'))
+PUSH_QUEUE_SIZE = int(os.getenv('PUSH_QUEUE_SIZE', '100'))
+
+# Responses of at least COMPRESSION_MIN_SIZE bytes are brotli (if installed)
+# or gzip compressed for clients that accept it (dms/compression.py).
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Owners are emailed a check-in reminder this many hours before a deadline
+# (only the tightest offset that still applies is sent). send_reminders runs
+# every REMINDER_INTERVAL_SECONDS.
+REMINDER_OFFSETS_HOURS = [int(hours) for hours in os.getenv('REMINDER_OFFSETS_HOURS', '24,1').split(',') if hours.strip()]
+REMINDER_INTERVAL_SECONDS = int(os.getenv('REMINDER_INTERVAL_SECONDS', '300'))
+
+# Triggered switches get one Delivery per action. Deliveries are split into
+# lanes (a chunk of emails, a webhook batch, or a single webhook) that run as
+# parallel Celery tasks; with DELIVERY_FANOUT=False they run inline instead.
+DELIVERY_FANOUT = os.getenv('DELIVERY_FANOUT', 'True') == 'True'
+DELIVERY_EMAIL_LANE_SIZE = int(os.getenv('DELIVERY_EMAIL_LANE_SIZE', '50'))
+
+# Webhook actions with batch_deliveries set are sent as one POST per target
+# URL per sweep, split into chunks of at most this many events.
+WEBHOOK_BATCH_MAX_SIZE = int(os.getenv('WEBHOOK_BATCH_MAX_SIZE', '100'))
+
+# Per-host webhook circuit breaker (switch/circuit.py) and the retry queue it
+# fails into. State is shared between workers through the cache.
+WEBHOOK_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('WEBHOOK_CIRCUIT_FAILURE_THRESHOLD', '5'))
+WEBHOOK_CIRCUIT_WINDOW_SECONDS = int(os.getenv('WEBHOOK_CIRCUIT_WINDOW_SECONDS', '60'))
+WEBHOOK_CIRCUIT_RESET_SECONDS = int(os.getenv('WEBHOOK_CIRCUIT_RESET_SECONDS', '60'))
+WEBHOOK_MAX_RETRIES = int(os.getenv('WEBHOOK_MAX_RETRIES', '5'))
+WEBHOOK_RETRY_DELAY_SECONDS = int(os.getenv('WEBHOOK_RETRY_DELAY_SECONDS', '60'))
+
+# Prometheus metrics (requires prometheus_client). Workers serve their own
+# /metrics on METRICS_WORKER_PORT; set PROMETHEUS_MULTIPROC_DIR when running
+# several web or worker processes.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_WORKER_PORT = os.getenv('METRICS_WORKER_PORT')
+
+# Logging: dms.* and switch.* loggers write JSON lines through a background
+# thread (dms/eventlog.py). LOG_EVENT_SAMPLE_RATES keeps only a fraction of
+# high-volume events, e.g. "switch.checkin=0.05,request.profile=0.1".
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_EVENT_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (
+        item.split('=', 1) for item in os.getenv('LOG_EVENT_SAMPLE_RATES', '').split(',') if '=' in item
+    )
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'events': {
+            'class': 'dms.eventlog.QueueingHandler',
+            'stream': 'ext://sys.stdout',
+        },
+    },
+    'loggers': {
+        'dms': {'handlers': ['events'], 'level': LOG_LEVEL, 'propagate': False},
+        'switch': {'handlers': ['events'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Per-request profiling: query count/time, serializer and view time as
+# Server-Timing headers. cProfile runs for PROFILER_SAMPLE_RATE of requests or
+# when the X-Profile header matches PROFILER_HEADER_TOKEN.
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'False') == 'True'
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0'))
+PROFILER_HEADER_TOKEN = os.getenv('PROFILER_HEADER_TOKEN', '')
+PROFILER_OUTPUT_DIR = os.getenv('PROFILER_OUTPUT_DIR', str(BASE_DIR / 'profiles'))
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST')
@@ -172,4 +316,7 @@ EMAIL_USE_SSL = True
 EMAIL_USE_TLS = False 
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')  
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')  
-DEFAULT_FROM_EMAIL = os.getenv('EMAIL_HOST_USER') 
\ No newline at end of file
+DEFAULT_FROM_EMAIL = os.getenv('EMAIL_HOST_USER') 
+
+# Compiled notification templates kept per process (dms/emails.py)
+EMAIL_TEMPLATE_CACHE_SIZE = int(os.getenv('EMAIL_TEMPLATE_CACHE_SIZE', '32'))
\ No newline at end of file
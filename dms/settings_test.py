@@ -0,0 +1,23 @@
+"""
+Django settings for the test suite.
+
+Cross-process state normally lives in Redis; here it stays in the test
+process, so the suite runs without a Redis server.
+
+manage.py selects this module for ``manage.py test`` unless
+DJANGO_SETTINGS_MODULE is set.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Status events stay in the process too
+PUSH_BROKER_URL = ''
+
+# A single process is all the tests run
+SILENCED_SYSTEM_CHECKS = ['switch.W001', 'switch.W002']
@@ -0,0 +1,26 @@
+"""
+Django settings for Celery worker and beat processes.
+
+Workers only run tasks, so everything that exists to serve HTTP (admin,
+sessions, messages, static files, CORS, DRF, templates and middleware) is
+dropped. ``django.setup()`` then imports a fraction of the web stack, which
+keeps worker boot and autoscaling fast.
+
+dms/celery_app.py selects this module unless DJANGO_SETTINGS_MODULE is set.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    'user.apps.UserConfig',
+    'switch.apps.SwitchConfig',
+    'django_celery_beat',
+]
+
+MIDDLEWARE = []
+
+TEMPLATES = []
+
+ROOT_URLCONF = "dms.urls_worker"
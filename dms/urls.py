@@ -18,7 +18,9 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from user.views import RegisterationViewSet, LoginViewSet,PasswordResetView,PasswordResetConfirmView
-from switch.views import SwitchViewSet, ActionViewSet, webhook_test,UserStatusView
+from switch.views import SwitchViewSet, ActionViewSet, ArchivedSwitchViewSet, webhook_test,UserStatusView,WebhookCircuitView,ExportView
+from switch import async_views
+from dms.metrics import metrics_view
 
 router= DefaultRouter()
 
@@ -26,12 +28,20 @@ router.register(r"register", RegisterationViewSet, basename="register")
 router.register(r"login", LoginViewSet, basename="login")
 router.register(r'switches', SwitchViewSet, basename='switch')
 router.register(r'actions', ActionViewSet, basename='action')
+router.register(r'archived-switches', ArchivedSwitchViewSet, basename='archived-switch')
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include(router.urls)),
-    path('api/webhook-test/', webhook_test),
-    path('api/my-status/', UserStatusView.as_view()),
+    path('api/webhook-test/', webhook_test, name='webhook-test'),
+    path('api/my-status/', UserStatusView.as_view(), name='user-status'),
+    path('api/webhook-circuits/', WebhookCircuitView.as_view(), name='webhook-circuits'),
+    path('api/export/<slug:resource>.<slug:fmt>', ExportView.as_view(), name='export'),
+    path('api/async/switches/', async_views.switch_list, name='async-switch-list'),
+    path('api/async/switches/<int:pk>/', async_views.switch_detail, name='async-switch-detail'),
+    path('api/async/switches/<int:pk>/checkin/', async_views.switch_checkin, name='async-switch-checkin'),
+    path('api/async/my-status/', async_views.user_status, name='async-user-status'),
     path('api/password-reset/', PasswordResetView.as_view(), name='password-reset'),
     path('api/password-reset-confirm/<uid>/<token>/', PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
+    path('metrics', metrics_view, name='metrics'),
 ]
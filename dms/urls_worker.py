@@ -0,0 +1,6 @@
+"""
+Workers serve no HTTP, so their URLconf is empty; this keeps the admin and
+DRF views from being imported by system checks or reverse().
+"""
+
+urlpatterns = []
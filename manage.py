@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dms.settings")
+    # The test suite has its own profile that needs no Redis
+    settings_module = "dms.settings_test" if sys.argv[1:2] == ["test"] else "dms.settings"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SwitchConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "switch"
+
+    def ready(self):
+        from . import checks  # noqa: F401
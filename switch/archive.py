@@ -0,0 +1,56 @@
+"""
+Moving long-triggered switches out of the live tables.
+
+``archive_batch`` copies up to ``limit`` switches that triggered before
+``cutoff``, with their message, actions and check-ins, into the ``Archived*``
+tables and deletes the originals (their deliveries, reminders and rollups go
+with them) in one transaction. Ids are kept, so an archived switch can be
+looked up by the id it had while live.
+
+Everything is read from the primary with the candidate switches locked: a
+replica may be missing the newest actions and check-ins, which the delete
+would then lose.
+"""
+
+from django.db import transaction
+
+from dms.routers import use_primary
+from .models import (
+    Action, ArchivedAction, ArchivedCheckIn, ArchivedSwitch, CheckIn, Switch, SwitchPayload,
+)
+
+ACTION_FIELDS = ['switch_id', 'type', 'target', 'description', 'batch_deliveries']
+
+
+def archivable(cutoff):
+    # next_trigger_date <= triggered_at, so the first filter narrows the range on the status/deadline index
+    return Switch.objects.filter(status='triggered', next_trigger_date__lte=cutoff, triggered_at__lte=cutoff)
+
+
+def archive_batch(cutoff, limit):
+    """Archive up to ``limit`` switches triggered before ``cutoff``; returns how many were moved"""
+    with use_primary(), transaction.atomic():
+        switches = list(
+            archivable(cutoff).select_for_update(skip_locked=True, of=('self',))
+            .order_by('next_trigger_date', 'id')
+            .values('id', 'user_id', 'title', 'inactivity_duration_days', 'last_checkin', 'created_at',
+                    'triggered_at', 'payload__data')[:limit]
+        )
+        if not switches:
+            return 0
+        ids = [switch['id'] for switch in switches]
+
+        ArchivedSwitch.objects.bulk_create(
+            ArchivedSwitch(data=switch.pop('payload__data') or SwitchPayload.compress(''), **switch)
+            for switch in switches
+        )
+        ArchivedAction.objects.bulk_create(
+            ArchivedAction(**action) for action in Action.objects.filter(switch_id__in=ids).values(*ACTION_FIELDS)
+        )
+        ArchivedCheckIn.objects.bulk_create(
+            [ArchivedCheckIn(switch_id=switch_id, timestamp=timestamp)
+             for switch_id, timestamp in CheckIn.objects.filter(switch_id__in=ids).values_list('switch_id', 'timestamp')],
+            batch_size=1000,
+        )
+        archivable(cutoff).filter(id__in=ids).delete()
+    return len(ids)
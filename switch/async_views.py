@@ -0,0 +1,124 @@
+"""
+Async versions of the busiest switch endpoints, for ASGI deployments.
+
+``/api/async/switches/``, ``/api/async/switches/{id}/``,
+``/api/async/switches/{id}/checkin/`` and ``/api/async/my-status/`` return
+the same data as their DRF counterparts but are plain Django async views
+using the async ORM, so under ``dms.asgi`` a request waiting on the database
+does not tie up a worker thread. They authenticate with the same access
+tokens. ``Idempotency-Key`` is only honoured by the DRF routes.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from dms import metrics, push
+from dms.eventlog import log_event
+from .models import CheckIn
+from .serializers import SwitchDetailSerializer, SwitchResponseSerializer
+from .views import switch_queryset
+
+
+async def authenticate(request):
+    """The active user whose access token came with the request, or None"""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw = authentication.get_raw_token(header) if header is not None else None
+    if raw is None:
+        return None
+    try:
+        token = authentication.get_validated_token(raw)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, AuthenticationFailed, KeyError):
+        return None
+    return await get_user_model().objects.filter(
+        **{api_settings.USER_ID_FIELD: user_id, 'is_active': True}
+    ).afirst()
+
+
+def authenticated(view):
+    """Runs ``view(request, user, ...)`` for authenticated requests and answers 401 otherwise"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await authenticate(request)
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        return await view(request, user, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+
+def not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+def render(serializer_class, instance, request, many=False):
+    try:
+        serializer = serializer_class(instance, many=many, context={'request': request})
+    except serializers.ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    return JsonResponse(serializer.data, safe=False)
+
+
+@require_GET
+@authenticated
+async def switch_list(request, user):
+    queryset = switch_queryset(request, user, 'list', SwitchResponseSerializer)
+    switches = [switch async for switch in queryset]
+    return render(SwitchResponseSerializer, switches, request, many=True)
+
+
+@require_GET
+@authenticated
+async def switch_detail(request, user, pk):
+    switch = await switch_queryset(request, user, 'retrieve', SwitchDetailSerializer).filter(pk=pk).afirst()
+    if switch is None:
+        return not_found()
+    return render(SwitchDetailSerializer, switch, request)
+
+
+@require_POST
+@authenticated
+async def switch_checkin(request, user, pk):
+    switch = await switch_queryset(request, user, 'checkin', None).filter(pk=pk).afirst()
+    if switch is None:
+        return not_found()
+    switch.last_checkin = timezone.now()
+    await switch.asave()
+    await CheckIn.objects.acreate(switch=switch)
+    metrics.CHECKINS.inc()
+    log_event('switch.checkin', switch_id=switch.id, user_id=user.id)
+    # Publishing to Redis is a blocking call
+    await sync_to_async(push.publish, thread_sensitive=False)(
+        user.id, 'switch.checkin', switch_id=switch.id,
+        last_checkin=switch.last_checkin, next_trigger_date=switch.next_trigger_date,
+    )
+    return JsonResponse({"message": "Check-in successful. Next trigger reset."})
+
+
+@require_GET
+@authenticated
+async def user_status(request, user):
+    summary = await user.switches.aaggregate(
+        last=Max('last_checkin'),
+        active=Count('id', filter=Q(status='active')),
+        triggered=Count('id', filter=Q(status='triggered')),
+    )
+    last_checkin = summary['last']
+    if last_checkin is not None:
+        last_checkin = last_checkin.strftime("%Y-%m-%d %H:%M:%S")
+    return JsonResponse({
+        'active_switches': summary['active'],
+        'triggered_switches': summary['triggered'],
+        'last_checkin': last_checkin,
+    })
@@ -0,0 +1,36 @@
+"""
+System checks for settings that only work within a single process.
+"""
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return []
+    return [Warning(
+        "The default cache is local to each process.",
+        hint="The sweep lock and checkpoint, webhook circuit breakers, idempotency locks and "
+             "replica pins are then not shared, so concurrent workers each take their own lock. "
+             "Set CACHE_URL (or REDIS_URL) unless only one process runs.",
+        id='switch.W001',
+    )]
+
+
+@register()
+def check_push_broker(app_configs, **kwargs):
+    if settings.PUSH_BROKER_URL:
+        return []
+    return [Warning(
+        "Status events are only delivered within the publishing process.",
+        hint="Trigger and delivery events are published by Celery workers and never reach "
+             "/api/events/ streams. Set PUSH_BROKER_URL (or REDIS_URL) unless only one process runs.",
+        id='switch.W002',
+    )]
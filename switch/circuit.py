@@ -0,0 +1,113 @@
+"""
+Per-host circuit breaker for webhook deliveries.
+
+State lives in the cache, so every worker shares it (unless ``CACHE_URL`` is
+set empty, which makes the cache per process):
+
+* closed - deliveries go through. Failures are counted, and the counter
+  expires ``WEBHOOK_CIRCUIT_WINDOW_SECONDS`` after the first one. Successes
+  do not reset it, so a host that fails on and off still trips the breaker.
+* open - after ``WEBHOOK_CIRCUIT_FAILURE_THRESHOLD`` failures in the window,
+  deliveries to the host raise ``CircuitOpen`` immediately instead of waiting
+  for the request timeout.
+* half-open - ``WEBHOOK_CIRCUIT_RESET_SECONDS`` after opening, a single
+  delivery is let through as a probe. Success closes the circuit; failure
+  opens it again.
+
+    with breaker_for(action.target):
+        requests.post(action.target, ...).raise_for_status()
+"""
+
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+
+from dms import metrics
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a host whose circuit is open"""
+
+    def __init__(self, host):
+        super().__init__(f"Circuit open for webhook host {host}")
+        self.host = host
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower() or url
+
+
+class CircuitBreaker:
+    def __init__(self, host):
+        self.host = host
+        self.failure_threshold = settings.WEBHOOK_CIRCUIT_FAILURE_THRESHOLD
+        self.reset_seconds = settings.WEBHOOK_CIRCUIT_RESET_SECONDS
+        self.window_seconds = settings.WEBHOOK_CIRCUIT_WINDOW_SECONDS
+        prefix = f'circuit:{host}'
+        self.failures_key = f'{prefix}:failures'
+        self.opened_key = f'{prefix}:opened'
+        self.probe_key = f'{prefix}:probe'
+
+    def state(self):
+        opened_at = cache.get(self.opened_key)
+        if opened_at is None:
+            return CLOSED
+        if time.time() - opened_at < self.reset_seconds:
+            return OPEN
+        return HALF_OPEN
+
+    def failures(self):
+        return cache.get(self.failures_key, 0)
+
+    def allow(self):
+        state = self.state()
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            # Only one worker gets to probe per reset period
+            return cache.add(self.probe_key, 1, self.reset_seconds)
+        return False
+
+    def record_success(self):
+        # Only a successful probe clears the failures; a closed circuit keeps
+        # counting them until the window expires
+        if cache.get(self.opened_key) is not None:
+            cache.delete_many([self.failures_key, self.opened_key, self.probe_key])
+
+    def record_failure(self):
+        cache.add(self.failures_key, 0, self.window_seconds)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:  # expired between add and incr
+            failures = 1
+        if failures >= self.failure_threshold or self.state() != CLOSED:
+            self.trip()
+
+    def trip(self):
+        # Kept well past the reset period so the half-open state is observable
+        cache.set(self.opened_key, time.time(), self.reset_seconds * 10)
+        cache.delete(self.probe_key)
+        metrics.WEBHOOK_CIRCUIT_TRIPS.inc()
+
+    def __enter__(self):
+        if not self.allow():
+            metrics.WEBHOOK_CIRCUIT_REJECTED.inc()
+            raise CircuitOpen(self.host)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.record_success()
+        else:
+            self.record_failure()
+        return False
+
+
+def breaker_for(url):
+    return CircuitBreaker(host_of(url))
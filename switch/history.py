@@ -0,0 +1,121 @@
+"""
+Check-in history for a single switch.
+
+``page`` walks a switch's check-ins (live or archived) in ``(timestamp, id)``
+order with a keyset cursor, so every page is a range scan on the
+``(switch, timestamp)`` index however deep into the history it is.
+
+``histogram`` counts check-ins per hour or per UTC day in the database. Day
+counts come from the ``CheckInDaily`` rollups for every whole day that
+``rollup_checkins`` has already covered, and from raw rows only for the
+partial days at the edges of the range and the days since the last rollup.
+How far the rollups reach is kept in the cache, since days without any
+check-ins leave no rows behind.
+"""
+
+import base64
+from datetime import datetime, time, timedelta, timezone
+
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate, TruncHour
+
+from .models import CheckIn, CheckInDaily
+
+ROLLED_UP_KEY = 'checkins:rolled-up-until'
+
+
+def encode_cursor(timestamp, checkin_id):
+    return base64.urlsafe_b64encode(f'{timestamp.isoformat()}|{checkin_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``; raises ``ValueError`` for anything else"""
+    timestamp, checkin_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(checkin_id)
+
+
+def page(checkins, start, end, limit, cursor=None):
+    """Up to ``limit`` of ``checkins`` in ``[start, end)`` after ``cursor``, and the cursor for the next page"""
+    checkins = checkins.filter(timestamp__gte=start, timestamp__lt=end)
+    if cursor is not None:
+        timestamp, checkin_id = decode_cursor(cursor)
+        checkins = checkins.filter(timestamp__gte=timestamp).exclude(timestamp=timestamp, id__lte=checkin_id)
+    rows = list(checkins.order_by('timestamp', 'id').values_list('id', 'timestamp')[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return [timestamp for _, timestamp in rows[:limit]], next_cursor
+
+
+def day_start(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def rolled_up_until():
+    """Start of the first UTC day not yet covered by ``CheckInDaily`` rollups, or None"""
+    day = cache.get(ROLLED_UP_KEY)
+    if day is None:
+        # Without the watermark, every day up to the newest rollup row is still covered
+        last = CheckInDaily.objects.aggregate(last=Max('day'))['last']
+        if last is None:
+            return None
+        day = last + timedelta(days=1)
+    return day_start(day)
+
+
+def mark_rolled_up(day):
+    """Record that every day up to and including ``day`` is rolled up"""
+    cache.set(ROLLED_UP_KEY, day + timedelta(days=1), None)
+
+
+def raw_counts(switch, start, end, bucket):
+    if start >= end:
+        return {}
+    trunc = TruncHour('timestamp', tzinfo=timezone.utc) if bucket == 'hour' else TruncDate('timestamp', tzinfo=timezone.utc)
+    rows = (
+        CheckIn.objects.filter(switch=switch, timestamp__gte=start, timestamp__lt=end)
+        .annotate(period=trunc).values('period').annotate(count=Count('id')).values_list('period', 'count')
+    )
+    counts = {}
+    for bucket_start, count in rows:
+        if not isinstance(bucket_start, datetime):
+            bucket_start = day_start(bucket_start)
+        counts[bucket_start] = counts.get(bucket_start, 0) + count
+    return counts
+
+
+def histogram(switch, start, end, bucket):
+    """``[(bucket start, count)]`` for the non-empty hour or day buckets in ``[start, end)``"""
+    if bucket == 'hour':
+        counts = raw_counts(switch, start, end, bucket)
+    else:
+        first_day = day_start(start.astimezone(timezone.utc).date())
+        if first_day < start:
+            first_day += timedelta(days=1)
+        rolled_end = min(day_start(end.astimezone(timezone.utc).date()), rolled_up_until() or first_day)
+        if rolled_end > first_day:
+            counts = raw_counts(switch, start, first_day, bucket)
+            rollups = CheckInDaily.objects.filter(switch=switch, day__gte=first_day.date(), day__lt=rolled_end.date())
+            for day, count in rollups.values_list('day', 'count'):
+                counts[day_start(day)] = count
+            for bucket_start, count in raw_counts(switch, rolled_end, end, bucket).items():
+                counts[bucket_start] = counts.get(bucket_start, 0) + count
+        else:
+            counts = raw_counts(switch, start, end, bucket)
+    return sorted(counts.items())
+
+
+def rollup_day(day):
+    """Write the ``CheckInDaily`` rows for one UTC day, replacing any already there"""
+    start = day_start(day)
+    rows = (
+        CheckIn.objects.filter(timestamp__gte=start, timestamp__lt=start + timedelta(days=1))
+        .values('switch_id').annotate(count=Count('id')).values_list('switch_id', 'count')
+    )
+    # MySQL updates on any unique key conflict and refuses an explicit target
+    features = connections[router.db_for_write(CheckInDaily)].features
+    unique_fields = ['switch', 'day'] if features.supports_update_conflicts_with_target else None
+    CheckInDaily.objects.bulk_create(
+        [CheckInDaily(switch_id=switch_id, day=day, count=count) for switch_id, count in rows],
+        update_conflicts=True, unique_fields=unique_fields, update_fields=['count'],
+    )
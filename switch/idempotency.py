@@ -0,0 +1,108 @@
+"""
+``Idempotency-Key`` support for mutating API calls.
+
+A client that sends ``Idempotency-Key: <unique value>`` can safely retry the
+request. The first response is stored for ``IDEMPOTENCY_TTL_SECONDS``, keyed
+by user, method, path and key, and a repeat gets that response back (with
+``Idempotent-Replayed: true``) without the view running again. A repeat with
+a different body is rejected with 422, and one that arrives while the first
+is still running with 409.
+
+Stored responses are kept in the cache and in the ``IdempotencyKey`` table,
+which answers when the cache has lost them (eviction, restarts, or the
+per-process local-memory cache).
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def _scope(request, key):
+    return _hash(f'{request.user.pk}:{request.method}:{request.path}:{key}')
+
+
+def _fingerprint(request):
+    return _hash(json.dumps(request.data, sort_keys=True, default=str))
+
+
+def _stored(scope):
+    stored = cache.get(f'idempotency:{scope}')
+    if stored is None:
+        record = IdempotencyKey.objects.filter(key=scope, expires_at__gt=timezone.now()).first()
+        if record is not None:
+            stored = {'fingerprint': record.fingerprint, 'status': record.status_code, 'data': record.response}
+    return stored
+
+
+def _store(scope, stored, ttl):
+    cache.set(f'idempotency:{scope}', stored, ttl)
+    try:
+        IdempotencyKey.objects.update_or_create(key=scope, defaults={
+            'fingerprint': stored['fingerprint'],
+            'status_code': stored['status'],
+            'response': stored['data'],
+            'expires_at': timezone.now() + timedelta(seconds=ttl),
+        })
+    except IntegrityError:
+        pass
+
+
+def idempotent(request, handler):
+    """Run ``handler()`` once per Idempotency-Key and replay its response for repeats"""
+    key = request.headers.get(HEADER)
+    if not key:
+        return handler()
+
+    scope = _scope(request, key)
+    fingerprint = _fingerprint(request)
+    stored = _stored(scope)
+    if stored is None:
+        ttl = settings.IDEMPOTENCY_TTL_SECONDS
+        lock = f'idempotency-lock:{scope}'
+        if not cache.add(lock, 1, 60):
+            return Response({'error': 'A request with this Idempotency-Key is in progress.'},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            # The first request may have stored its response and released the
+            # lock between the check above and taking it here
+            stored = _stored(scope)
+            if stored is None:
+                response = handler()
+                # Server errors are worth retrying for real
+                if response.status_code < 500:
+                    data = json.loads(JSONRenderer().render(response.data))
+                    _store(scope, {'fingerprint': fingerprint, 'status': response.status_code, 'data': data}, ttl)
+                return response
+        finally:
+            cache.delete(lock)
+
+    if stored['fingerprint'] != fingerprint:
+        return Response({'error': 'Idempotency-Key was already used with a different request body.'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+class IdempotentCreateMixin:
+    """Honours Idempotency-Key on ``create``"""
+
+    def create(self, request, *args, **kwargs):
+        return idempotent(request, lambda: super(IdempotentCreateMixin, self).create(request, *args, **kwargs))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from switch.seeding import SEED_PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = "Populate the database with synthetic users, switches, actions and check-in history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--switches-per-user', type=int, default=3)
+        parser.add_argument('--checkins-per-switch', type=int, default=10,
+                            help="Average check-in history length per switch")
+        parser.add_argument('--overdue-ratio', type=float, default=0.01,
+                            help="Fraction of switches that are active but past their deadline")
+        parser.add_argument('--triggered-ratio', type=float, default=0.05)
+        parser.add_argument('--webhook-ratio', type=float, default=0.3)
+        parser.add_argument('--webhook-url', default='https://hooks.example.com/dms')
+        parser.add_argument('--password', default=SEED_PASSWORD,
+                            help="Password shared by every seeded user")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for reproducible data")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = seed(
+            users=options['users'],
+            switches_per_user=options['switches_per_user'],
+            checkins_per_switch=options['checkins_per_switch'],
+            overdue_ratio=options['overdue_ratio'],
+            triggered_ratio=options['triggered_ratio'],
+            webhook_ratio=options['webhook_ratio'],
+            webhook_url=options['webhook_url'],
+            password=options['password'],
+            batch_size=options['batch_size'],
+            random_seed=options['seed'],
+            log=lambda line: self.stdout.write(line) if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['users']} users, {counts['switches']} switches, {counts['actions']} actions "
+            f"and {counts['checkins']} check-ins ({rows} rows) in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)"
+        ))
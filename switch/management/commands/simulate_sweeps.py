@@ -0,0 +1,66 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from switch.seeding import seed
+from switch.simulation import run_simulation
+
+
+class Command(BaseCommand):
+    help = (
+        "Run check_switches repeatedly under a fake clock against local SMTP and HTTP sinks "
+        "and report trigger throughput, lateness and memory per sweep. Triggers switches in "
+        "the configured database, so only run it against a development copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=72, help="Simulated time span")
+        parser.add_argument('--step-minutes', type=float, default=60, help="Simulated time between sweeps")
+        parser.add_argument('--seed-users', type=int, default=0,
+                            help="Seed this many users before simulating (see seed_dms)")
+        parser.add_argument('--seed', type=int, default=None, help="Random seed for seeded data")
+        parser.add_argument('--webhook-latency-ms', type=float, default=0,
+                            help="Artificial response time of the webhook sink")
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="Measure peak Python allocations per sweep with tracemalloc (slower)")
+        parser.add_argument('--output', help="Write the full report as JSON")
+        parser.add_argument('--force', action='store_true', help="Allow running with DEBUG off")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("simulate_sweeps mutates switch data; pass --force to run with DEBUG off")
+
+        if options['seed_users']:
+            counts = seed(users=options['seed_users'], random_seed=options['seed'])
+            self.stdout.write(f"Seeded {counts['switches']} switches for {counts['users']} users")
+
+        def log(sweep):
+            if sweep['due'] or options['verbosity'] > 1:
+                self.stdout.write(
+                    f"{sweep['clock']}  due={sweep['due']} triggered={sweep['triggered']} "
+                    f"in {sweep['duration_s']}s ({sweep['triggers_per_s']}/s) "
+                    f"lateness p50={sweep['lateness_p50_s']}s max={sweep['lateness_max_s']}s "
+                    f"rss={sweep['max_rss_kb']}kB"
+                )
+
+        report = run_simulation(
+            hours=options['hours'],
+            step=timedelta(minutes=options['step_minutes']),
+            webhook_latency=options['webhook_latency_ms'] / 1000,
+            trace_memory=options['trace_memory'],
+            log=log,
+        )
+
+        summary = report['summary']
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['sweeps']} sweeps, {summary['triggered']} triggers "
+            f"({summary['emails']} emails, {summary['webhooks']} webhooks), "
+            f"{summary['triggers_per_s']} triggers/s, lateness p50={summary['lateness_p50_s']}s "
+            f"p95={summary['lateness_p95_s']}s max={summary['lateness_max_s']}s, "
+            f"slowest sweep {summary['max_sweep_s']}s"
+        ))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-10-19 09:12
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def populate_next_trigger_date(apps, schema_editor):
+    Switch = apps.get_model("switch", "Switch")
+    for switch in Switch.objects.only("id", "last_checkin", "inactivity_duration_days").iterator():
+        Switch.objects.filter(pk=switch.pk).update(
+            next_trigger_date=switch.last_checkin
+            + timedelta(days=switch.inactivity_duration_days)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("switch", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="switch",
+            name="next_trigger_date",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_next_trigger_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="switch",
+            name="next_trigger_date",
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="switch",
+            index=models.Index(
+                fields=["status", "next_trigger_date"], name="switch_status_deadline_idx"
+            ),
+        ),
+    ]
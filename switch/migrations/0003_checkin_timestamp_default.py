@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('switch', '0002_switch_next_trigger_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='checkin',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('switch', '0003_checkin_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='batch_deliveries',
+            field=models.BooleanField(default=False, help_text='Webhook only: deliver together with other switches triggering for the same URL'),
+        ),
+    ]
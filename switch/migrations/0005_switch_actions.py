@@ -0,0 +1,101 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_actions_to_switches(apps, schema_editor):
+    Action = apps.get_model("switch", "Action")
+    Switch = apps.get_model("switch", "Switch")
+    for switch_id, action_id in Switch.objects.values_list("id", "action_id").iterator():
+        Action.objects.filter(pk=action_id).update(switch_id=switch_id)
+    # Actions were only ever created together with their switch
+    Action.objects.filter(switch__isnull=True).delete()
+
+
+def unlink_actions(apps, schema_editor):
+    Action = apps.get_model("switch", "Action")
+    Switch = apps.get_model("switch", "Switch")
+    for action_id, switch_id in Action.objects.order_by("-id").values_list("id", "switch_id").iterator():
+        Switch.objects.filter(pk=switch_id).update(action_id=action_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("switch", "0004_action_batch_deliveries"),
+    ]
+
+    operations = [
+        # Frees the Action.switch name for the new foreign key
+        migrations.AlterField(
+            model_name="switch",
+            name="action",
+            field=models.OneToOneField(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="switch.action",
+            ),
+        ),
+        migrations.AddField(
+            model_name="action",
+            name="switch",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="actions",
+                to="switch.switch",
+            ),
+        ),
+        migrations.RunPython(link_actions_to_switches, unlink_actions),
+        migrations.RemoveField(
+            model_name="switch",
+            name="action",
+        ),
+        migrations.AlterField(
+            model_name="action",
+            name="switch",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="actions",
+                to="switch.switch",
+            ),
+        ),
+        migrations.CreateModel(
+            name="Delivery",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("deadline", models.DateTimeField(help_text="The switch deadline that triggered this delivery")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "Pending"), ("delivered", "Delivered"), ("failed", "Failed")],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "action",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="switch.action",
+                    ),
+                ),
+                (
+                    "switch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="switch.switch",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["switch", "status"], name="delivery_switch_status_idx")],
+            },
+        ),
+    ]
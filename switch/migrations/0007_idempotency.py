@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+
+def populate_delivery_keys(apps, schema_editor):
+    Delivery = apps.get_model("switch", "Delivery")
+    for delivery in Delivery.objects.only("id", "switch_id", "action_id").iterator():
+        Delivery.objects.filter(pk=delivery.pk).update(
+            idempotency_key=f"switch-{delivery.switch_id}-gen-0-action-{delivery.action_id}-{delivery.pk}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("switch", "0006_reminder"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="switch",
+            name="generation",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="delivery",
+            name="idempotency_key",
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.RunPython(populate_delivery_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="delivery",
+            name="idempotency_key",
+            field=models.CharField(help_text="Switch, trigger generation and action", max_length=100, unique=True),
+        ),
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(help_text="Hash of user, method, path and the client's key", max_length=64, unique=True)),
+                ("fingerprint", models.CharField(help_text="Hash of the request body", max_length=64)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("response", models.JSONField()),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
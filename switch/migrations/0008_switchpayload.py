@@ -0,0 +1,60 @@
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_messages_to_payloads(apps, schema_editor):
+    Switch = apps.get_model("switch", "Switch")
+    SwitchPayload = apps.get_model("switch", "SwitchPayload")
+    batch = []
+    for switch_id, message in Switch.objects.values_list("id", "message").iterator():
+        batch.append(SwitchPayload(switch_id=switch_id, data=zlib.compress(message.encode())))
+        if len(batch) == 1000:
+            SwitchPayload.objects.bulk_create(batch)
+            batch = []
+    SwitchPayload.objects.bulk_create(batch)
+
+
+def move_payloads_to_messages(apps, schema_editor):
+    Switch = apps.get_model("switch", "Switch")
+    SwitchPayload = apps.get_model("switch", "SwitchPayload")
+    for switch_id, data in SwitchPayload.objects.values_list("switch_id", "data").iterator():
+        Switch.objects.filter(pk=switch_id).update(message=zlib.decompress(data).decode())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("switch", "0007_idempotency"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SwitchPayload",
+            fields=[
+                (
+                    "switch",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="payload",
+                        serialize=False,
+                        to="switch.switch",
+                    ),
+                ),
+                ("data", models.BinaryField(help_text="zlib compressed UTF-8 message")),
+            ],
+        ),
+        # Lets the column be re-added to existing rows when migrating backwards
+        migrations.AlterField(
+            model_name="switch",
+            name="message",
+            field=models.TextField(default=""),
+        ),
+        migrations.RunPython(move_messages_to_payloads, move_payloads_to_messages),
+        migrations.RemoveField(
+            model_name="switch",
+            name="message",
+        ),
+    ]
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("switch", "0008_switchpayload"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="checkin",
+            index=models.Index(fields=["switch", "timestamp"], name="checkin_switch_time_idx"),
+        ),
+        migrations.CreateModel(
+            name="CheckInDaily",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("count", models.PositiveIntegerField()),
+                (
+                    "switch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_checkins",
+                        to="switch.switch",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("switch", "day"), name="checkin_daily_once_per_day"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_triggered_at(apps, schema_editor):
+    Switch = apps.get_model("switch", "Switch")
+    # The trigger time was not recorded; the deadline is the closest known value
+    Switch.objects.filter(status="triggered").update(triggered_at=F("next_trigger_date"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("switch", "0009_checkin_history"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="switch",
+            name="triggered_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_triggered_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name="ArchivedSwitch",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("title", models.CharField(max_length=100)),
+                ("data", models.BinaryField(help_text="zlib compressed UTF-8 message, as in SwitchPayload")),
+                ("inactivity_duration_days", models.PositiveIntegerField()),
+                ("last_checkin", models.DateTimeField()),
+                ("created_at", models.DateTimeField()),
+                ("triggered_at", models.DateTimeField(null=True)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_switches",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedAction",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("type", models.CharField(choices=[("email", "Email"), ("webhook", "Webhook")], max_length=20)),
+                ("target", models.CharField(max_length=255)),
+                ("description", models.TextField(blank=True, null=True)),
+                ("batch_deliveries", models.BooleanField(default=False)),
+                (
+                    "switch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="actions",
+                        to="switch.archivedswitch",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedCheckIn",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("timestamp", models.DateTimeField()),
+                (
+                    "switch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="checkins",
+                        to="switch.archivedswitch",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["switch", "timestamp"], name="archived_checkin_time_idx")],
+            },
+        ),
+    ]
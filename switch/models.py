@@ -1,3 +1,5 @@
+import zlib
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -11,9 +13,14 @@ class ActionType(models.TextChoices):
 
 class Action(models.Model):
     """An action that gets triggered when a switch activates"""
+    switch = models.ForeignKey('Switch', on_delete=models.CASCADE, related_name='actions')
     type = models.CharField(max_length=20, choices=ActionType.choices)
     target = models.CharField(max_length=255, help_text="Email address or webhook URL")
     description = models.TextField(blank=True, null=True)
+    batch_deliveries = models.BooleanField(
+        default=False,
+        help_text="Webhook only: deliver together with other switches triggering for the same URL"
+    )
 
     def __str__(self):
         return f"{self.type} → {self.target}"
@@ -23,29 +30,219 @@ class Switch(models.Model):
     """Core dead man's switch"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='switches')
     title = models.CharField(max_length=100)
-    message = models.TextField()
     inactivity_duration_days = models.PositiveIntegerField()
     last_checkin = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=[('active', 'Active'), ('triggered', 'Triggered')], default='active')
+    # Denormalised deadline so the sweep can use an index instead of date maths
+    next_trigger_date = models.DateTimeField(editable=False)
+    # Incremented every time the switch triggers; part of each delivery's idempotency key
+    generation = models.PositiveIntegerField(default=0, editable=False)
+    triggered_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_trigger_date'], name='switch_status_deadline_idx'),
+        ]
 
-    action = models.OneToOneField(Action, on_delete=models.CASCADE, related_name='switch')
+    # The message body lives in SwitchPayload and is only loaded when read
+    _message = None
+    _message_changed = False
 
     def __str__(self):
         return f"{self.title} ({self.user.username})"
 
     @property
-    def next_trigger_date(self):
+    def message(self):
+        if self._message is None:
+            try:
+                self._message = self.payload.message
+            except SwitchPayload.DoesNotExist:
+                self._message = ''
+        return self._message
+
+    @message.setter
+    def message(self, value):
+        self._message = value
+        self._message_changed = True
+
+    def compute_next_trigger_date(self):
         return self.last_checkin + timedelta(days=self.inactivity_duration_days)
 
+    def save(self, *args, **kwargs):
+        self.next_trigger_date = self.compute_next_trigger_date()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'last_checkin', 'inactivity_duration_days'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'next_trigger_date'}
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if self._message_changed:
+            data = SwitchPayload.compress(self._message)
+            if adding:
+                SwitchPayload.objects.create(switch=self, data=data)
+            else:
+                SwitchPayload.objects.update_or_create(switch=self, defaults={'data': data})
+            self._message_changed = False
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._message = None
+        self._message_changed = False
+
     def should_trigger(self):
         return timezone.now() >= self.next_trigger_date and self.status == 'active'
 
 
+class SwitchPayload(models.Model):
+    """A switch's message body, compressed and kept out of the switch table"""
+    switch = models.OneToOneField(Switch, on_delete=models.CASCADE, primary_key=True, related_name='payload')
+    data = models.BinaryField(help_text="zlib compressed UTF-8 message")
+
+    def __str__(self):
+        return f"Payload: {self.switch_id}"
+
+    @staticmethod
+    def compress(message):
+        return zlib.compress(message.encode())
+
+    @property
+    def message(self):
+        return zlib.decompress(self.data).decode()
+
+
 class CheckIn(models.Model):
     """Tracks user check-ins per switch"""
     switch = models.ForeignKey(Switch, on_delete=models.CASCADE, related_name='checkins')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add so historical check-ins can be bulk loaded
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['switch', 'timestamp'], name='checkin_switch_time_idx'),
+        ]
 
     def __str__(self):
         return f"CheckIn: {self.switch.title} @ {self.timestamp}"
+
+
+class CheckInDaily(models.Model):
+    """Number of check-ins a switch received on one UTC day, filled in by ``rollup_checkins``"""
+    switch = models.ForeignKey(Switch, on_delete=models.CASCADE, related_name='daily_checkins')
+    day = models.DateField()
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['switch', 'day'], name='checkin_daily_once_per_day'),
+        ]
+
+    def __str__(self):
+        return f"CheckIns: {self.switch_id} on {self.day}: {self.count}"
+
+
+class DeliveryStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    DELIVERED = 'delivered', 'Delivered'
+    FAILED = 'failed', 'Failed'
+
+
+class Delivery(models.Model):
+    """Tracks one action's delivery for a triggered switch"""
+    switch = models.ForeignKey(Switch, on_delete=models.CASCADE, related_name='deliveries')
+    action = models.ForeignKey(Action, on_delete=models.CASCADE, related_name='deliveries')
+    idempotency_key = models.CharField(max_length=100, unique=True, help_text="Switch, trigger generation and action")
+    deadline = models.DateTimeField(help_text="The switch deadline that triggered this delivery")
+    status = models.CharField(max_length=20, choices=DeliveryStatus.choices, default=DeliveryStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['switch', 'status'], name='delivery_switch_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Delivery: {self.action} ({self.status})"
+
+    @staticmethod
+    def key_for(switch_id, generation, action_id):
+        return f"switch-{switch_id}-gen-{generation}-action-{action_id}"
+
+
+class Reminder(models.Model):
+    """A check-in reminder sent to a switch owner ahead of one deadline"""
+    switch = models.ForeignKey(Switch, on_delete=models.CASCADE, related_name='reminders')
+    offset_hours = models.PositiveIntegerField(help_text="How many hours before the deadline this reminder is for")
+    deadline = models.DateTimeField(help_text="The switch deadline the reminder warns about")
+    status = models.CharField(max_length=20, choices=DeliveryStatus.choices, default=DeliveryStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['switch', 'deadline', 'offset_hours'], name='reminder_once_per_offset'),
+        ]
+
+    def __str__(self):
+        return f"Reminder: {self.switch.title} {self.offset_hours}h before {self.deadline}"
+
+
+class IdempotencyKey(models.Model):
+    """Stored response for an API request sent with an Idempotency-Key header"""
+    key = models.CharField(max_length=64, unique=True, help_text="Hash of user, method, path and the client's key")
+    fingerprint = models.CharField(max_length=64, help_text="Hash of the request body")
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"IdempotencyKey: {self.key}"
+
+
+class ArchivedSwitch(models.Model):
+    """A switch moved out of the live tables by ``archive_switches`` some time after it triggered"""
+    # Keeps the id the switch had while it was live
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_switches')
+    title = models.CharField(max_length=100)
+    data = models.BinaryField(help_text="zlib compressed UTF-8 message, as in SwitchPayload")
+    inactivity_duration_days = models.PositiveIntegerField()
+    last_checkin = models.DateTimeField()
+    created_at = models.DateTimeField()
+    triggered_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived: {self.title} ({self.user_id})"
+
+    @property
+    def message(self):
+        return zlib.decompress(self.data).decode()
+
+
+class ArchivedAction(models.Model):
+    switch = models.ForeignKey(ArchivedSwitch, on_delete=models.CASCADE, related_name='actions')
+    type = models.CharField(max_length=20, choices=ActionType.choices)
+    target = models.CharField(max_length=255)
+    description = models.TextField(blank=True, null=True)
+    batch_deliveries = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.type} → {self.target}"
+
+
+class ArchivedCheckIn(models.Model):
+    switch = models.ForeignKey(ArchivedSwitch, on_delete=models.CASCADE, related_name='checkins')
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['switch', 'timestamp'], name='archived_checkin_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived CheckIn: {self.switch_id} @ {self.timestamp}"
@@ -0,0 +1,136 @@
+"""
+Synthetic data generation for capacity planning and benchmarks.
+
+Rows are built in memory one batch at a time and written with ``bulk_create``
+using explicit primary keys, so related rows can point at each other without
+reading ids back from the database. Every seeded user shares a single password
+hash that is computed once up front.
+"""
+
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Action, ActionType, CheckIn, Switch, SwitchPayload
+
+User = get_user_model()
+
+# Most people pick a week or a month; a long tail picks much longer windows
+DURATION_CHOICES = (1, 3, 7, 14, 30, 60, 90, 180, 365)
+DURATION_WEIGHTS = (4, 8, 30, 18, 22, 7, 6, 3, 2)
+
+SEED_PASSWORD = 'seed-password-123'
+
+
+def seed_username(user_id):
+    return f'seed_user_{user_id}'
+
+
+def seed_email(user_id):
+    return f'{seed_username(user_id)}@example.com'
+
+
+def _next_id(model):
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+def _chunks(start, count, size):
+    for offset in range(0, count, size):
+        yield start + offset, min(size, count - offset)
+
+
+def seed(users=1000, switches_per_user=3, checkins_per_switch=10, overdue_ratio=0.01,
+         triggered_ratio=0.05, webhook_ratio=0.3, webhook_url='https://hooks.example.com/dms',
+         password=SEED_PASSWORD, batch_size=5000, random_seed=None, log=None):
+    """Insert users with switches, actions and check-in history; returns row counts"""
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    password_hash = make_password(password)
+    counts = {'users': 0, 'actions': 0, 'switches': 0, 'checkins': 0}
+
+    user_id = _next_id(User)
+    switch_id = _next_id(Switch)
+    action_id = _next_id(Action)
+    users_per_batch = max(1, batch_size // max(1, switches_per_user))
+
+    for first_user, n_users in _chunks(user_id, users, users_per_batch):
+        user_rows, action_rows, switch_rows, payload_rows, checkin_rows = [], [], [], [], []
+
+        for uid in range(first_user, first_user + n_users):
+            user_rows.append(User(
+                id=uid,
+                username=seed_username(uid),
+                email=seed_email(uid),
+                password=password_hash,
+                date_joined=now,
+            ))
+
+            for _ in range(switches_per_user):
+                days = rng.choices(DURATION_CHOICES, DURATION_WEIGHTS)[0]
+                window = timedelta(days=days)
+                roll = rng.random()
+                if roll < triggered_ratio:
+                    status = 'triggered'
+                    last_checkin = now - window - timedelta(days=rng.uniform(1, 90))
+                elif roll < triggered_ratio + overdue_ratio:
+                    status = 'active'
+                    last_checkin = now - window - timedelta(hours=rng.uniform(0, 6))
+                else:
+                    status = 'active'
+                    last_checkin = now - window * rng.uniform(0, 0.95)
+
+                if rng.random() < webhook_ratio:
+                    action_type, target = ActionType.WEBHOOK, f'{webhook_url}/{uid}'
+                else:
+                    action_type, target = ActionType.EMAIL, seed_email(uid)
+
+                payload_rows.append(SwitchPayload(
+                    switch_id=switch_id, data=SwitchPayload.compress(f'Seeded message for switch {switch_id}.'),
+                ))
+                action_rows.append(Action(id=action_id, switch_id=switch_id, type=action_type, target=target))
+                switch_rows.append(Switch(
+                    id=switch_id,
+                    user_id=uid,
+                    title=f'Seeded switch {switch_id}',
+                    inactivity_duration_days=days,
+                    last_checkin=last_checkin,
+                    next_trigger_date=last_checkin + window,
+                    triggered_at=last_checkin + window if status == 'triggered' else None,
+                    status=status,
+                ))
+
+                # History walks backwards from the latest check-in
+                timestamp = last_checkin
+                for _ in range(rng.randint(0, 2 * checkins_per_switch)):
+                    checkin_rows.append(CheckIn(switch_id=switch_id, timestamp=timestamp))
+                    timestamp -= window * rng.uniform(0.1, 0.9)
+
+                switch_id += 1
+                action_id += 1
+
+        with transaction.atomic():
+            User.objects.bulk_create(user_rows, batch_size=batch_size)
+            Switch.objects.bulk_create(switch_rows, batch_size=batch_size)
+            SwitchPayload.objects.bulk_create(payload_rows, batch_size=batch_size)
+            Action.objects.bulk_create(action_rows, batch_size=batch_size)
+            CheckIn.objects.bulk_create(checkin_rows, batch_size=batch_size)
+
+        counts['users'] += len(user_rows)
+        counts['actions'] += len(action_rows)
+        counts['switches'] += len(switch_rows)
+        counts['checkins'] += len(checkin_rows)
+        if log:
+            log(f"{counts['users']}/{users} users, {counts['switches']} switches, {counts['checkins']} check-ins")
+
+    # Explicit ids leave PostgreSQL sequences behind; other backends catch up on their own
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [User, Action, Switch]):
+            cursor.execute(sql)
+
+    return counts
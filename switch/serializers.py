@@ -1,20 +1,35 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Switch, Action, CheckIn, ActionType
+from .models import Switch, Action, CheckIn, ActionType, Delivery, ArchivedAction, ArchivedSwitch
+from .history import decode_cursor
+from dms.fieldsets import SparseFieldsMixin
+from dms.profiling import ProfiledSerializerMixin
 
-class ActionSerializer(serializers.ModelSerializer):
+class ActionSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Action
-        fields = ['type', 'target']
+        fields = ['type', 'target', 'batch_deliveries']
 
-class SwitchCreateSerializer(serializers.ModelSerializer):
+class SwitchCreateSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    # Stored in SwitchPayload, see Switch.message
+    message = serializers.CharField()
+    actions = ActionSerializer(many=True, required=False)
+    # Shorthand for a switch with a single action
     action_type = serializers.ChoiceField(
         choices=ActionType.choices,
         write_only=True,
-        source='action.type'
+        required=False
     )
     action_target = serializers.CharField(
         write_only=True,
-        source='action.target'
+        required=False
+    )
+    action_batch = serializers.BooleanField(
+        write_only=True,
+        required=False
     )
 
     class Meta:
@@ -23,14 +38,40 @@ class SwitchCreateSerializer(serializers.ModelSerializer):
             'title', 
             'message', 
             'inactivity_duration_days',
+            'actions',
             'action_type',
-            'action_target'
+            'action_target',
+            'action_batch'
         ]
 
-class SwitchResponseSerializer(serializers.ModelSerializer):
+    def validate(self, data):
+        actions = data.get('actions') or []
+        batch = data.pop('action_batch', False)
+        if 'action_type' in data or 'action_target' in data:
+            if not data.get('action_type') or not data.get('action_target'):
+                raise serializers.ValidationError("action_type and action_target must be given together.")
+            actions.append({
+                'type': data.pop('action_type'),
+                'target': data.pop('action_target'),
+                'batch_deliveries': batch,
+            })
+        if not actions:
+            raise serializers.ValidationError("A switch needs at least one action.")
+        data['actions'] = actions
+        return data
+
+    def create(self, validated_data):
+        actions = validated_data.pop('actions')
+        with transaction.atomic():
+            switch = Switch.objects.create(**validated_data)
+            Action.objects.bulk_create(Action(switch=switch, **action) for action in actions)
+        return switch
+
+class SwitchResponseSerializer(SparseFieldsMixin, ProfiledSerializerMixin, serializers.ModelSerializer):
     next_trigger_date = serializers.DateTimeField(read_only=True,format="%Y-%m-%d %H:%M:%S")
     status = serializers.CharField(read_only=True)
-    action_type = serializers.CharField(source='action.type', read_only=True)
+    action_type = serializers.SerializerMethodField()
+    actions = ActionSerializer(many=True, read_only=True)
     last_checkin = serializers.DateTimeField(read_only=True,format="%Y-%m-%d %H:%M:%S")
 
     class Meta:
@@ -41,14 +82,72 @@ class SwitchResponseSerializer(serializers.ModelSerializer):
             'status',
             'last_checkin',
             'next_trigger_date',
-            'action_type'
+            'action_type',
+            'actions'
         ]
 
-class CheckInSerializer(serializers.ModelSerializer):
+    def get_action_type(self, obj):
+        # Type of the first action, kept for clients written for one action per switch
+        actions = obj.actions.all()
+        return actions[0].type if actions else None
+
+class SwitchDetailSerializer(SwitchResponseSerializer):
+    message = serializers.CharField(read_only=True)
+
+    class Meta(SwitchResponseSerializer.Meta):
+        fields = SwitchResponseSerializer.Meta.fields + ['message']
+
+class DeliverySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    action_type = serializers.CharField(source='action.type', read_only=True)
+    action_target = serializers.CharField(source='action.target', read_only=True)
+
+    class Meta:
+        model = Delivery
+        fields = ['id', 'action_type', 'action_target', 'deadline', 'status', 'attempts', 'last_error', 'created_at', 'completed_at']
+
+class ArchivedActionSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedAction
+        fields = ['type', 'target', 'batch_deliveries']
+
+class ArchivedSwitchSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    actions = ArchivedActionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedSwitch
+        fields = ['id', 'title', 'inactivity_duration_days', 'last_checkin', 'created_at', 'triggered_at', 'archived_at', 'actions']
+
+class ArchivedSwitchDetailSerializer(ArchivedSwitchSerializer):
+    message = serializers.CharField(read_only=True)
+
+    class Meta(ArchivedSwitchSerializer.Meta):
+        fields = ArchivedSwitchSerializer.Meta.fields + ['message']
+
+class CheckInHistoryQuerySerializer(ProfiledSerializerMixin, serializers.Serializer):
+    """Query parameters of the check-in history endpoint"""
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    bucket = serializers.ChoiceField(choices=['hour', 'day'], required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    cursor = serializers.CharField(required=False)
+
+    def validate(self, data):
+        data.setdefault('end', timezone.now())
+        data.setdefault('start', data['end'] - timedelta(days=365))
+        if data['start'] >= data['end']:
+            raise serializers.ValidationError("start must be before end.")
+        if 'cursor' in data:
+            try:
+                decode_cursor(data['cursor'])
+            except ValueError:
+                raise serializers.ValidationError({'cursor': "Invalid cursor."})
+        return data
+
+class CheckInSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CheckIn
         fields = []
 
-class ActionTypeSerializer(serializers.Serializer):
+class ActionTypeSerializer(ProfiledSerializerMixin, serializers.Serializer):
     type = serializers.CharField()
-    description = serializers.CharField()
\ No newline at end of file
+    description = serializers.CharField()
@@ -0,0 +1,230 @@
+"""
+Fake-clock sweep simulation.
+
+Runs ``check_switches`` repeatedly while a controllable clock moves forward,
+so days of switch deadlines can be exercised in seconds. Email goes to a local
+SMTP sink and every outbound HTTP request is redirected to a local HTTP sink,
+so nothing leaves the machine. Each sweep reports triggers per second,
+lateness (fire time minus ``next_trigger_date``) and memory use.
+"""
+
+import resource
+import socketserver
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlsplit
+
+import requests
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from .models import Switch
+from .tasks import check_switches
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages from smtplib and count them"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 dms-sink ESMTP')
+        in_data = False
+        for raw in self.rfile:
+            line = raw.rstrip(b'\r\n')
+            if in_data:
+                if line == b'.':
+                    in_data = False
+                    self.server.sink.record()
+                    self.reply('250 OK')
+                continue
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 dms-sink')
+            elif command == b'DATA':
+                in_data = True
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class _HttpHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.server.sink.latency:
+            time.sleep(self.server.sink.latency)
+        self.server.sink.record()
+        self.send_response(self.server.sink.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Sink:
+    server_class = None
+    handler_class = None
+
+    def __init__(self, latency=0.0, status=200):
+        self.latency = latency
+        self.status = status
+        self.received = 0
+        self._lock = threading.Lock()
+        self.server = self.server_class(('127.0.0.1', 0), self.handler_class)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+
+    def record(self):
+        with self._lock:
+            self.received += 1
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SmtpSink(_Sink):
+    server_class = socketserver.ThreadingTCPServer
+    handler_class = _SmtpHandler
+
+
+class HttpSink(_Sink):
+    server_class = ThreadingHTTPServer
+    handler_class = _HttpHandler
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+
+class FakeClock:
+    """Replaces django.utils.timezone.now with a clock that only moves when told to"""
+
+    def __init__(self, start=None):
+        self.now = start or timezone.now()
+
+    def advance(self, delta):
+        self.now += delta
+
+    def __call__(self):
+        return self.now
+
+    def install(self):
+        return mock.patch('django.utils.timezone.now', self)
+
+
+def _redirect_requests(sink_url):
+    """Send every outbound requests call to the HTTP sink, keeping the path"""
+    original = requests.Session.request
+
+    def request(session, method, url, *args, **kwargs):
+        parts = urlsplit(url)
+        return original(session, method, f'{sink_url}{parts.path or "/"}', *args, **kwargs)
+
+    return mock.patch.object(requests.Session, 'request', request)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def run_simulation(hours=72, step=timedelta(hours=1), webhook_latency=0.0, trace_memory=False, log=None):
+    """Advance the clock ``hours`` in ``step`` increments, sweeping after each step"""
+    sweeps = []
+    all_lateness = []
+
+    with ExitStack() as stack:
+        smtp = stack.enter_context(SmtpSink())
+        http = stack.enter_context(HttpSink(latency=webhook_latency))
+        stack.enter_context(override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=smtp.port,
+            EMAIL_USE_SSL=False, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            # Deliver in-process so each sweep's sends are measured with it
+            DELIVERY_FANOUT=False,
+        ))
+        stack.enter_context(_redirect_requests(http.url))
+        clock = FakeClock()
+        stack.enter_context(clock.install())
+
+        end = clock.now + timedelta(hours=hours)
+        while clock.now < end:
+            clock.advance(step)
+            deadlines = dict(
+                Switch.objects.filter(status='active', next_trigger_date__lte=clock.now)
+                .values_list('id', 'next_trigger_date')
+            )
+            emails_before, webhooks_before = smtp.received, http.received
+
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            check_switches()
+            elapsed = time.perf_counter() - started
+            if trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                peak_memory = None
+
+            fired = Switch.objects.filter(id__in=list(deadlines), status='triggered').values_list('id', flat=True)
+            # The clock is frozen during a sweep, so deliveries land at sweep time plus its wall duration
+            fire_time = clock.now + timedelta(seconds=elapsed)
+            lateness = sorted(round((fire_time - deadlines[switch_id]).total_seconds(), 3) for switch_id in fired)
+            all_lateness.extend(lateness)
+
+            sweep = {
+                'clock': clock.now.isoformat(),
+                'due': len(deadlines),
+                'triggered': len(lateness),
+                'emails': smtp.received - emails_before,
+                'webhooks': http.received - webhooks_before,
+                'duration_s': round(elapsed, 4),
+                'triggers_per_s': round(len(lateness) / elapsed, 1) if elapsed else None,
+                'lateness_p50_s': _percentile(lateness, 0.5),
+                'lateness_max_s': lateness[-1] if lateness else None,
+                'peak_traced_bytes': peak_memory,
+                'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }
+            sweeps.append(sweep)
+            if log:
+                log(sweep)
+
+    all_lateness.sort()
+    busy = [s for s in sweeps if s['triggered']]
+    total_time = sum(s['duration_s'] for s in busy)
+    return {
+        'hours': hours,
+        'step_s': step.total_seconds(),
+        'sweeps': sweeps,
+        'summary': {
+            'sweeps': len(sweeps),
+            'triggered': len(all_lateness),
+            'emails': sum(s['emails'] for s in sweeps),
+            'webhooks': sum(s['webhooks'] for s in sweeps),
+            'triggers_per_s': round(len(all_lateness) / total_time, 1) if total_time else None,
+            'lateness_p50_s': _percentile(all_lateness, 0.5),
+            'lateness_p95_s': _percentile(all_lateness, 0.95),
+            'lateness_max_s': all_lateness[-1] if all_lateness else None,
+            'max_sweep_s': max((s['duration_s'] for s in sweeps), default=None),
+            'max_peak_traced_bytes': max((s['peak_traced_bytes'] or 0 for s in sweeps), default=None),
+        },
+    }
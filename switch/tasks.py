@@ -1,61 +1,495 @@
-from celery import shared_task
+from celery import group, shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Min, Q
 from django.utils import timezone
-from .models import Switch
-import requests
-from django.core.mail import send_mail
-from datetime import timedelta
+from .models import CheckIn, Delivery, DeliveryStatus, IdempotencyKey, Reminder, Switch
+from django.core.mail import get_connection
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
 import logging
-from django.db.models import F
+import time
+import uuid
+from dms import emails, metrics, push
+from dms.eventlog import log_event
+from dms.routers import PRIMARY, replica_alias
+from .circuit import CircuitOpen, breaker_for
+from .archive import archive_batch
+from .history import mark_rolled_up, rolled_up_until, rollup_day
 
 # Correct logger initialization
 logger = logging.getLogger(__name__)
 
-@shared_task
+SWEEP_LOCK_KEY = 'sweep:lock'
+SWEEP_CHECKPOINT_KEY = 'sweep:checkpoint'
+
+@shared_task(ignore_result=True)
 def check_switches():
     """Check and trigger switches that have expired"""
+    # Never run two sweeps at once, e.g. when one outlasts the beat interval
+    token = uuid.uuid4().hex
+    if not cache.add(SWEEP_LOCK_KEY, token, settings.SWEEP_LOCK_SECONDS):
+        log_event('sweep.skipped', reason='locked')
+        return
+    try:
+        sweep()
+    finally:
+        if cache.get(SWEEP_LOCK_KEY) == token:
+            cache.delete(SWEEP_LOCK_KEY)
+
+def sweep():
+    """
+    Trigger due switches in (deadline, id) order within the time and row budget.
+
+    Stopping early saves the last processed key so the next sweep resumes
+    after it; a sweep that reaches the end clears it and the next one starts
+    from the oldest deadline again.
+    """
+    started = time.perf_counter()
+    checkpoint = cache.get(SWEEP_CHECKPOINT_KEY)
+    due_count = triggered_count = 0
+
+    with metrics.SWEEP_DURATION.time():
+        now = timezone.now()
+        while True:
+            limit = min(settings.SWEEP_CHUNK_SIZE, settings.SWEEP_ROW_BUDGET - due_count)
+            switches, scanned, last_key = due_chunk(now, checkpoint, limit)
+            due_count += scanned
+            triggered_count += trigger_switches(switches)
+            if scanned < limit:
+                checkpoint = None
+                break
+            checkpoint = last_key
+            cache.touch(SWEEP_LOCK_KEY, settings.SWEEP_LOCK_SECONDS)
+            if due_count >= settings.SWEEP_ROW_BUDGET or time.perf_counter() - started >= settings.SWEEP_TIME_BUDGET_SECONDS:
+                break
+
+        metrics.SWITCHES_OVERDUE.set(due_count)
+        if checkpoint is None:
+            cache.delete(SWEEP_CHECKPOINT_KEY)
+            metrics.SWEEP_LAG_SECONDS.set(0)
+        else:
+            cache.set(SWEEP_CHECKPOINT_KEY, checkpoint, None)
+            metrics.SWEEP_LAG_SECONDS.set((now - checkpoint[0]).total_seconds())
+
+    log_event(
+        'sweep.completed',
+        due=due_count,
+        triggered=triggered_count,
+        resume_after=checkpoint,
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+def due_chunk(now, after, limit):
+    """Up to ``limit`` due switches after the ``(deadline, id)`` key ``after``.
+
+    Returns the switches, the number of rows scanned and the key of the last one.
+    """
+    due = Switch.objects.filter(status='active', next_trigger_date__lte=now)
+    if after is not None:
+        deadline, switch_id = after
+        due = due.filter(Q(next_trigger_date__gt=deadline) | Q(next_trigger_date=deadline, id__gt=switch_id))
+    due = due.order_by('next_trigger_date', 'id')
+
+    # Find candidates on a replica, then re-check them on the primary so a
+    # check-in that has not replicated yet still prevents the trigger
+    source = replica_alias()
+    if source != PRIMARY:
+        keys = list(due.using(source).values_list('next_trigger_date', 'id')[:limit])
+        switches = list(due.using(PRIMARY).filter(id__in=[key[1] for key in keys]).prefetch_related('actions'))
+    else:
+        switches = list(due.using(PRIMARY).prefetch_related('actions')[:limit])
+        keys = [(switch.next_trigger_date, switch.id) for switch in switches]
+    return switches, len(keys), keys[-1] if keys else None
+
+def trigger_switches(expired_switches):
+    """Mark due switches triggered and fan out one delivery per action; returns how many were triggered"""
+    if not expired_switches:
+        return 0
+    now = timezone.now()
+    with transaction.atomic():
+        # Claim only switches that are still due: a check-in since they were
+        # found moved the deadline, and a locked row is being changed right now
+        claimed = dict(
+            Switch.objects.using(PRIMARY).select_for_update(skip_locked=True)
+            .filter(id__in=[switch.id for switch in expired_switches], status='active', next_trigger_date__lte=now)
+            .values_list('id', 'generation')
+        )
+        triggered = Switch.objects.filter(id__in=claimed, status='active', next_trigger_date__lte=now).update(
+            status='triggered', generation=F('generation') + 1, triggered_at=now,
+        )
+        expired_switches = [switch for switch in expired_switches if switch.id in claimed]
+        deliveries = [
+            Delivery(
+                switch=switch,
+                action=action,
+                idempotency_key=Delivery.key_for(switch.id, claimed[switch.id] + 1, action.id),
+                deadline=switch.next_trigger_date,
+            )
+            for switch in expired_switches
+            for action in switch.actions.all()
+        ]
+        # A delivery that already exists for this generation is never created twice
+        Delivery.objects.bulk_create(deliveries, ignore_conflicts=True)
+    metrics.SWITCHES_TRIGGERED.inc(triggered)
+    for switch in expired_switches:
+        log_event('switch.triggered', switch_id=switch.id, deadline=switch.next_trigger_date,
+                  actions=len(switch.actions.all()))
+        push.publish(switch.user_id, 'switch.triggered', switch_id=switch.id, deadline=switch.next_trigger_date)
+
+    # MySQL does not return ids from bulk_create, so read them back, from the
+    # primary since a replica may not have them yet
+    actions = {action.id: action for switch in expired_switches for action in switch.actions.all()}
+    pending = Delivery.objects.using(PRIMARY).filter(
+        idempotency_key__in=[delivery.idempotency_key for delivery in deliveries], status=DeliveryStatus.PENDING, attempts=0,
+    )
+    fan_out(delivery_lanes((delivery_id, actions[action_id]) for delivery_id, action_id in pending.values_list('id', 'action_id')))
+    return triggered
+
+@shared_task(ignore_result=True)
+def send_reminders():
+    """Queue check-in reminders for switches whose deadline is within a reminder offset"""
+    offsets = sorted(settings.REMINDER_OFFSETS_HOURS)
+    if not offsets:
+        return
     now = timezone.now()
-    expired_switches = Switch.objects.filter(
-        status='active',
-        last_checkin__lt=now - timedelta(days=F('inactivity_duration_days'))
+    # A range over the (status, next_trigger_date) index
+    upcoming = list(
+        Switch.objects.filter(
+            status='active',
+            next_trigger_date__gt=now,
+            next_trigger_date__lte=now + timedelta(hours=offsets[-1]),
+        ).values_list('id', 'next_trigger_date')
+    )
+    if not upcoming:
+        return
+
+    sent = defaultdict(list)
+    for switch_id, deadline, offset in Reminder.objects.filter(
+            switch_id__in=[switch_id for switch_id, _ in upcoming]).values_list('switch_id', 'deadline', 'offset_hours'):
+        sent[switch_id, deadline].append(offset)
+
+    reminders = []
+    for switch_id, deadline in upcoming:
+        # Only the tightest offset that applies; a wider reminder is never sent late
+        offset = next(offset for offset in offsets if deadline - now <= timedelta(hours=offset))
+        if any(previous <= offset for previous in sent[switch_id, deadline]):
+            continue
+        reminders.append(Reminder(switch_id=switch_id, deadline=deadline, offset_hours=offset))
+    if not reminders:
+        return
+
+    Reminder.objects.bulk_create(reminders, ignore_conflicts=True)
+    # Only this run's rows; an earlier reminder still waiting on its lane is already queued
+    keys = {(reminder.switch_id, reminder.deadline, reminder.offset_hours) for reminder in reminders}
+    pending = [
+        reminder_id for reminder_id, *key in Reminder.objects.using(PRIMARY).filter(
+            switch_id__in={switch_id for switch_id, _, _ in keys},
+            offset_hours__in={offset for _, _, offset in keys},
+            status=DeliveryStatus.PENDING, attempts=0,
+        ).values_list('id', 'switch_id', 'deadline', 'offset_hours')
+        if tuple(key) in keys
+    ]
+    fan_out((deliver_reminder_lane, ids) for ids in chunked(pending, settings.DELIVERY_EMAIL_LANE_SIZE))
+    log_event('reminders.queued', count=len(reminders))
+
+@shared_task(ignore_result=True)
+def deliver_reminder_lane(reminder_ids):
+    # Lanes are queued right after their rows are written
+    reminders = list(
+        Reminder.objects.using(PRIMARY).filter(id__in=reminder_ids)
+        .exclude(status=DeliveryStatus.DELIVERED)
+        .select_related('switch__user')
     )
-    
-    for switch in expired_switches.select_related('action'):
+    send_emails('switch_reminder', 'reminder', 'reminder_id', [
+        (reminder, reminder.switch.user.email, reminder_context(reminder)) for reminder in reminders
+    ])
+    Reminder.objects.bulk_update(reminders, ['status', 'attempts', 'last_error', 'completed_at'])
+
+def reminder_context(reminder):
+    return {
+        **switch_context(reminder.switch),
+        'username': reminder.switch.user.username,
+        'deadline': reminder.deadline,
+        'offset_hours': reminder.offset_hours,
+    }
+
+@shared_task(ignore_result=True)
+def purge_idempotency_keys():
+    """Delete stored API responses whose Idempotency-Key has expired"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    log_event('idempotency.purged', count=deleted)
+
+@shared_task(ignore_result=True)
+def rollup_checkins():
+    """Count check-ins per switch for each whole UTC day since the last rollup"""
+    today = timezone.now().astimezone(dt_timezone.utc).date()
+    since = rolled_up_until()
+    if since is None:
+        first = CheckIn.objects.aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            return
+        since = first.astimezone(dt_timezone.utc)
+    day, days = since.date(), 0
+    # A long backlog is worked off over several runs
+    while day < today and days < settings.CHECKIN_ROLLUP_MAX_DAYS:
+        rollup_day(day)
+        # Advanced for empty days too, which write no rows
+        mark_rolled_up(day)
+        day += timedelta(days=1)
+        days += 1
+    log_event('checkins.rolled_up', days=days, until=day)
+
+@shared_task(ignore_result=True)
+def archive_switches():
+    """Move switches triggered more than ARCHIVE_AFTER_DAYS ago to the archive tables"""
+    cutoff = timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    archived = 0
+    # Short transactions, and whatever is left waits for the next run
+    for _ in range(settings.ARCHIVE_MAX_BATCHES):
+        moved = archive_batch(cutoff, settings.ARCHIVE_BATCH_SIZE)
+        archived += moved
+        if moved < settings.ARCHIVE_BATCH_SIZE:
+            break
+    log_event('switches.archived', count=archived)
+
+def delivery_lanes(deliveries):
+    """Split ``(delivery_id, action)`` pairs into ``(task, ids)`` lanes that are delivered independently"""
+    email_ids, single_ids = [], []
+    by_target = defaultdict(list)
+    for delivery_id, action in deliveries:
+        if action.type == 'email':
+            email_ids.append(delivery_id)
+        elif is_batched(action):
+            by_target[action.target].append(delivery_id)
+        else:
+            single_ids.append(delivery_id)
+
+    lanes = [(deliver_email_lane, ids) for ids in chunked(email_ids, settings.DELIVERY_EMAIL_LANE_SIZE)]
+    for ids in by_target.values():
+        lanes.extend((deliver_webhook_lane, batch) for batch in chunked(ids, settings.WEBHOOK_BATCH_MAX_SIZE))
+    # A slow webhook receiver only holds up its own delivery
+    lanes.extend((deliver_webhook_lane, [delivery_id]) for delivery_id in single_ids)
+    return lanes
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def fan_out(lanes):
+    """Run each lane as its own task so they are delivered in parallel across workers"""
+    tasks = [task.si(ids) for task, ids in lanes]
+    if not tasks:
+        return
+    if settings.DELIVERY_FANOUT:
         try:
-            trigger_switch(switch)
-            switch.status = 'triggered'
-            switch.save(update_fields=['status'])
-        except Exception as e:
-            logger.error(f"Failed to trigger switch {switch.id}: {str(e)}")
-
-def trigger_switch(switch):
-    """Execute the associated action for a switch"""
-    action = switch.action
-    
+            group(tasks).apply_async()
+            return
+        except Exception:
+            # The switches are already triggered and nothing else would pick
+            # these deliveries up, so deliver them here instead
+            logger.exception("Could not queue %s delivery lanes, delivering inline", len(tasks))
+    for task in tasks:
+        task.apply()
+
+# Email and webhook lanes are separate tasks so CELERY_TASK_ROUTES can give
+# them their own queues, and slow webhook receivers never delay emails
+@shared_task(ignore_result=True)
+def deliver_email_lane(delivery_ids):
+    deliver_actions(delivery_ids)
+
+@shared_task(ignore_result=True)
+def deliver_webhook_lane(delivery_ids, attempt=0):
+    deliver_actions(delivery_ids, attempt)
+
+def deliver_actions(delivery_ids, attempt=0):
+    """Deliver a lane of actions and record the outcome of each"""
+    # Lanes are queued right after their rows are written, so a replica may not have them
+    deliveries = list(
+        Delivery.objects.using(PRIMARY).filter(id__in=delivery_ids)
+        .exclude(status=DeliveryStatus.DELIVERED)
+        .select_related('action', 'switch__payload')
+    )
+    deliver_emails([delivery for delivery in deliveries if delivery.action.type == 'email'])
+    # Webhook actions that opted into batching are coalesced per target
+    deliver_webhook_batches([delivery for delivery in deliveries if is_batched(delivery.action)], attempt)
+    for delivery in deliveries:
+        if delivery.action.type == 'webhook' and not is_batched(delivery.action):
+            deliver_webhook(delivery, attempt)
+
+    Delivery.objects.bulk_update(deliveries, ['status', 'attempts', 'last_error', 'completed_at'])
+    for delivery in deliveries:
+        push.publish(delivery.switch.user_id, 'delivery.completed', switch_id=delivery.switch_id,
+                     delivery_id=delivery.id, action_type=delivery.action.type,
+                     status=delivery.status, attempts=delivery.attempts)
+
+    failed = [delivery.id for delivery in deliveries
+              if delivery.status == DeliveryStatus.FAILED and delivery.action.type == 'webhook']
+    if failed:
+        schedule_webhook_retry(failed, attempt + 1)
+
+def complete(delivery, error):
+    delivery.attempts += 1
+    if error is None:
+        delivery.status = DeliveryStatus.DELIVERED
+        delivery.completed_at = timezone.now()
+        delivery.last_error = ''
+    else:
+        delivery.status = DeliveryStatus.FAILED
+        delivery.last_error = str(error) or type(error).__name__
+
+def schedule_webhook_retry(delivery_ids, attempt):
+    """Queue a retry with exponential backoff, up to WEBHOOK_MAX_RETRIES attempts"""
+    if attempt > settings.WEBHOOK_MAX_RETRIES:
+        log_event('delivery.abandoned', level=logging.WARNING, delivery_ids=delivery_ids, attempts=attempt)
+        return
+    countdown = settings.WEBHOOK_RETRY_DELAY_SECONDS * 2 ** (attempt - 1)
     try:
-        if action.type == 'email':
-            send_email_action(action, switch.message)
-        elif action.type == 'webhook':
-            trigger_webhook(action, switch.message)
-    except Exception as e:
-        # Handle errors (log them, retry, etc.)
-        print(f"Failed to trigger action for switch {switch.id}: {str(e)}")
-
-def send_email_action(action, message):
-    send_mail(
-        subject='Dead Man Switch Triggered',
-        message=message,
-        from_email='noreply@yourdomain.com',
-        recipient_list=[action.target],
-        fail_silently=False,
+        deliver_webhook_lane.apply_async((delivery_ids, attempt), countdown=countdown)
+    except Exception:
+        logger.exception("Could not queue webhook retry for deliveries %s", delivery_ids)
+
+def record_delivery(action_type, started, error, **fields):
+    """Metrics and a delivery.attempt event for one outbound delivery"""
+    elapsed = time.perf_counter() - started
+    metrics.DELIVERY_DURATION.labels(action_type).observe(elapsed)
+    if error is not None:
+        metrics.DELIVERY_FAILURES.labels(action_type).inc()
+    log_event(
+        'delivery.attempt',
+        level=logging.INFO if error is None else logging.WARNING,
+        action_type=action_type,
+        outcome='ok' if error is None else 'circuit_open' if isinstance(error, CircuitOpen) else 'failed',
+        error=error,
+        duration_ms=round(elapsed * 1000, 1),
+        **fields
     )
 
-def trigger_webhook(action, message):
-    requests.post(
-        url=action.target,
-        json={
-            'event': 'deadman_switch_triggered',
-            'message': message,
-            'timestamp': timezone.now().isoformat()
-        },
-        timeout=10
-    )
\ No newline at end of file
+def is_batched(action):
+    return action.type == 'webhook' and action.batch_deliveries
+
+def deliver_webhook(delivery, attempt=0):
+    started = time.perf_counter()
+    error = None
+    try:
+        trigger_webhook(delivery.action, delivery.switch.message, delivery.idempotency_key)
+    except Exception as e:
+        error = e
+    finally:
+        complete(delivery, error)
+        record_delivery('webhook', started, error, delivery_id=delivery.id,
+                        switch_id=delivery.switch_id, attempt=attempt)
+
+def deliver_webhook_batches(deliveries, attempt=0):
+    """POST one array of events per target URL"""
+    by_target = defaultdict(list)
+    for delivery in deliveries:
+        by_target[delivery.action.target].append(delivery)
+
+    for target, group_deliveries in by_target.items():
+        for batch in chunked(group_deliveries, settings.WEBHOOK_BATCH_MAX_SIZE):
+            started = time.perf_counter()
+            error = None
+            try:
+                send_webhook_batch(target, batch)
+            except Exception as e:
+                error = e
+            finally:
+                for delivery in batch:
+                    complete(delivery, error)
+                record_delivery('webhook', started, error, batch_size=len(batch),
+                                delivery_ids=[delivery.id for delivery in batch], attempt=attempt)
+
+def switch_context(switch):
+    return {
+        'title': switch.title,
+        'inactivity_duration_days': switch.inactivity_duration_days,
+        'last_checkin': switch.last_checkin,
+    }
+
+def email_context(switch):
+    # Reading the message loads the switch's payload unless it was selected with it
+    return {**switch_context(switch), 'message': switch.message}
+
+def deliver_emails(deliveries):
+    """Send trigger emails over a single connection"""
+    send_emails('switch_triggered', 'email', 'delivery_id', [
+        (delivery, delivery.action.target, email_context(delivery.switch)) for delivery in deliveries
+    ])
+
+def send_emails(template, action_type, id_field, items):
+    """Render ``(record, to, context)`` items in one batch and send them over one connection
+
+    Each record is a Delivery or Reminder; its outcome is set with ``complete`` and
+    logged under ``id_field``.
+    """
+    if not items:
+        return
+    connection = get_connection()
+    messages = emails.build_messages(template, [(to, context) for _, to, context in items], connection=connection)
+    try:
+        # Failing to connect here is retried, and recorded, per message below
+        connection.open()
+    except Exception:
+        logger.warning("Could not open mail connection", exc_info=True)
+
+    try:
+        for (record, _, _), message in zip(items, messages):
+            started = time.perf_counter()
+            error = None
+            try:
+                message.send()
+            except Exception as e:
+                error = e
+            finally:
+                complete(record, error)
+                record_delivery(action_type, started, error, switch_id=record.switch_id, **{id_field: record.id})
+    finally:
+        connection.close()
+
+def trigger_webhook(action, message, idempotency_key=None):
+    # Imported here so worker boot does not pay for requests/urllib3
+    import requests
+    payload = {
+        'event': 'deadman_switch_triggered',
+        'message': message,
+        'timestamp': timezone.now().isoformat()
+    }
+    headers = {}
+    if idempotency_key:
+        # Stays the same across retries, so receivers can drop repeats
+        payload['idempotency_key'] = idempotency_key
+        headers['Idempotency-Key'] = idempotency_key
+    with breaker_for(action.target):
+        response = requests.post(
+            url=action.target,
+            json=payload,
+            headers=headers,
+            timeout=10
+        )
+        response.raise_for_status()
+
+def send_webhook_batch(target, deliveries):
+    import requests
+    now = timezone.now().isoformat()
+    with breaker_for(target):
+        response = requests.post(
+            url=target,
+            json={
+                'event': 'deadman_switch_triggered_batch',
+                'timestamp': now,
+                'events': [
+                    {
+                        'event': 'deadman_switch_triggered',
+                        'idempotency_key': delivery.idempotency_key,
+                        'switch_id': delivery.switch_id,
+                        'message': delivery.switch.message,
+                        'timestamp': now,
+                    }
+                    for delivery in deliveries
+                ],
+            },
+            timeout=10
+        )
+        response.raise_for_status()
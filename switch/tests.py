@@ -1,3 +1,1087 @@
-from django.test import TestCase
+import asyncio
+from contextlib import contextmanager
+import gzip
+import json
+import tempfile
+import time
+import os
 
-# Create your tests here.
+from django.conf import settings
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.http import HttpResponse
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import connections, transaction
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from io import StringIO
+from unittest import mock
+from django.utils import timezone
+from datetime import timedelta
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import Switch, SwitchPayload, Action, ArchivedCheckIn, ArchivedSwitch, CheckIn, CheckInDaily, Delivery, IdempotencyKey, Reminder
+from .tasks import SWEEP_CHECKPOINT_KEY, SWEEP_LOCK_KEY, archive_switches, check_switches, due_chunk, purge_idempotency_keys, rollup_checkins, send_reminders, trigger_switches
+from . import idempotency
+from .checks import check_push_broker, check_shared_cache
+from .circuit import CLOSED, HALF_OPEN, OPEN, breaker_for
+from .history import rolled_up_until
+from .simulation import run_simulation
+from dms import push
+from dms.database import database_config, replica_configs
+from dms.eventlog import QueueingHandler, events_logger, log_event
+from dms.profiling import RequestProfilerMiddleware
+from dms.routers import PRIMARY, PrimaryReplicaRouter, ReplicaStickinessMiddleware, replica_alias, use_primary
+
+
+User = get_user_model()
+
+
+def make_switch(user, days=7, checked_in_days_ago=0, action_type='email', target='to@example.com', batch=False, **kwargs):
+    switch = Switch.objects.create(
+        user=user,
+        title=kwargs.pop('title', 'Switch'),
+        message=kwargs.pop('message', 'Goodbye'),
+        inactivity_duration_days=days,
+        last_checkin=timezone.now() - timedelta(days=checked_in_days_ago),
+        **kwargs
+    )
+    Action.objects.create(switch=switch, type=action_type, target=target, batch_deliveries=batch)
+    return switch
+
+
+@contextmanager
+def lagging_replica(*tables, alias='replica_0'):
+    """A replica of the test database that has not received any rows of ``tables`` yet"""
+    def lag(execute, sql, params, many, context):
+        if any(f'"{table}"' in sql for table in tables):
+            sql = f'SELECT * FROM ({sql}) WHERE 0'
+        return execute(sql, params, many, context)
+
+    connections.settings[alias] = dict(connections.settings[PRIMARY])
+    try:
+        with mock.patch('dms.routers.replica_aliases', return_value=[alias]), connections[alias].execute_wrapper(lag):
+            yield connections[alias]
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+@override_settings(DELIVERY_FANOUT=False)
+class CheckSwitchesTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+
+    def test_triggers_only_overdue_switches(self):
+        overdue = make_switch(self.user, days=1, checked_in_days_ago=2)
+        fresh = make_switch(self.user, days=7, checked_in_days_ago=2)
+
+        check_switches()
+
+        overdue.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(overdue.status, 'triggered')
+        self.assertEqual(fresh.status, 'active')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['to@example.com'])
+
+    def test_triggered_switches_are_not_fired_again(self):
+        make_switch(self.user, days=1, checked_in_days_ago=2)
+
+        check_switches()
+        check_switches()
+
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_checkin_after_the_search_prevents_the_trigger(self):
+        switch = make_switch(self.user, days=1, checked_in_days_ago=2)
+        found, _, _ = due_chunk(timezone.now(), None, 10)
+        Switch.objects.filter(id=switch.id).update(
+            last_checkin=timezone.now(), next_trigger_date=timezone.now() + timedelta(days=1),
+        )
+
+        self.assertEqual(trigger_switches(found), 0)
+
+        switch.refresh_from_db()
+        self.assertEqual(switch.status, 'active')
+        self.assertFalse(Delivery.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(DELIVERY_FANOUT=True)
+    def test_lanes_are_delivered_inline_when_they_cannot_be_queued(self):
+        make_switch(self.user, days=1, checked_in_days_ago=2)
+
+        with mock.patch('celery.group.apply_async', side_effect=ConnectionError('broker down')):
+            check_switches()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Delivery.objects.get().status, 'delivered')
+
+    def test_sweep_is_skipped_while_another_holds_the_lock(self):
+        make_switch(self.user, days=1, checked_in_days_ago=2)
+        cache.add(SWEEP_LOCK_KEY, 'other-worker')
+
+        check_switches()
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(cache.get(SWEEP_LOCK_KEY), 'other-worker')
+
+    @override_settings(SWEEP_ROW_BUDGET=2, SWEEP_CHUNK_SIZE=1)
+    def test_sweep_over_budget_resumes_from_checkpoint(self):
+        oldest, middle, newest = [make_switch(self.user, days=1, checked_in_days_ago=ago) for ago in (5, 4, 3)]
+
+        check_switches()
+
+        self.assertEqual(cache.get(SWEEP_CHECKPOINT_KEY), (middle.next_trigger_date, middle.id))
+        self.assertEqual(Switch.objects.get(id=newest.id).status, 'active')
+
+        check_switches()
+
+        self.assertIsNone(cache.get(SWEEP_CHECKPOINT_KEY))
+        self.assertEqual(Switch.objects.filter(status='triggered').count(), 3)
+        self.assertEqual([email.to for email in mail.outbox], [['to@example.com']] * 3)
+
+    @override_settings(DEFAULT_FROM_EMAIL='alerts@example.com')
+    def test_trigger_email_is_rendered_from_templates(self):
+        make_switch(self.user, days=1, checked_in_days_ago=2, title='Vault', message='Key is <in> the drawer')
+
+        check_switches()
+
+        email = mail.outbox[0]
+        self.assertEqual(email.subject, 'Dead Man Switch Triggered: Vault')
+        self.assertEqual(email.from_email, 'alerts@example.com')
+        self.assertTrue(email.body.startswith('Key is <in> the drawer'))
+        html, mimetype = email.alternatives[0]
+        self.assertEqual(mimetype, 'text/html')
+        self.assertIn('Key is &lt;in&gt; the drawer', html)
+
+    @override_settings(WEBHOOK_BATCH_MAX_SIZE=2)
+    def test_batched_webhooks_share_one_post_per_target(self):
+        hook = 'https://hooks.example.com/in'
+        batched = [make_switch(self.user, days=1, checked_in_days_ago=2, action_type='webhook', target=hook, batch=True)
+                   for _ in range(3)]
+        single = make_switch(self.user, days=1, checked_in_days_ago=2, action_type='webhook', target=hook)
+
+        with mock.patch('requests.post') as post:
+            check_switches()
+
+        # Two chunks for the batched switches, one plain POST for the other
+        self.assertEqual(post.call_count, 3)
+        batches = [call.kwargs['json'] for call in post.call_args_list if 'events' in call.kwargs['json']]
+        self.assertEqual([len(batch['events']) for batch in batches], [2, 1])
+        self.assertEqual(sorted(event['switch_id'] for batch in batches for event in batch['events']),
+                         [switch.id for switch in batched])
+        self.assertEqual(len({event['idempotency_key'] for batch in batches for event in batch['events']}), 3)
+        self.assertEqual(Switch.objects.filter(status='triggered').count(), 4)
+        single.refresh_from_db()
+        self.assertEqual(single.status, 'triggered')
+
+
+class MultipleActionsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def create_switch(self, **data):
+        return self.client.post('/api/switches/', {
+            'title': 'Vault', 'message': 'Goodbye', 'inactivity_duration_days': 1, **data,
+        }, content_type='application/json', **self.auth)
+
+    def test_create_with_several_actions(self):
+        response = self.create_switch(actions=[
+            {'type': 'email', 'target': 'a@example.com'},
+            {'type': 'webhook', 'target': 'https://hooks.example.com/in', 'batch_deliveries': True},
+        ])
+
+        self.assertEqual(response.status_code, 201, response.content)
+        switch = Switch.objects.get()
+        self.assertEqual(sorted(switch.actions.values_list('type', flat=True)), ['email', 'webhook'])
+
+        listed = self.client.get('/api/switches/', **self.auth).json()[0]
+        self.assertEqual(len(listed['actions']), 2)
+        self.assertEqual(listed['action_type'], 'email')
+
+    def test_create_with_single_action_shorthand(self):
+        response = self.create_switch(action_type='webhook', action_target='https://hooks.example.com/in')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(list(Action.objects.values_list('type', 'target')), [('webhook', 'https://hooks.example.com/in')])
+
+    def test_create_requires_an_action(self):
+        self.assertEqual(self.create_switch().status_code, 400)
+
+    @override_settings(DELIVERY_FANOUT=False)
+    def test_each_action_is_delivered_and_tracked(self):
+        switch = make_switch(self.user, days=1, checked_in_days_ago=2)
+        Action.objects.create(switch=switch, type='webhook', target='https://down.example.com/in')
+        Action.objects.create(switch=switch, type='email', target='b@example.com')
+
+        with mock.patch('requests.post', side_effect=ConnectionError), \
+                mock.patch('switch.tasks.deliver_webhook_lane.apply_async') as retry:
+            check_switches()
+
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), ['b@example.com', 'to@example.com'])
+        statuses = dict(switch.deliveries.values_list('action__target', 'status'))
+        self.assertEqual(statuses, {
+            'to@example.com': 'delivered',
+            'b@example.com': 'delivered',
+            'https://down.example.com/in': 'failed',
+        })
+        retry.assert_called_once()
+
+        response = self.client.get(f'/api/switches/{switch.id}/deliveries/', **self.auth)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_deliveries_fan_out_as_parallel_tasks(self):
+        switch = make_switch(self.user, days=1, checked_in_days_ago=2)
+        for index in range(2):
+            Action.objects.create(switch=switch, type='webhook', target=f'https://hooks.example.com/{index}')
+
+        with mock.patch('switch.tasks.group') as group:
+            check_switches()
+
+        # One lane for the email and one per unbatched webhook, each on its own queue
+        lanes = group.call_args.args[0]
+        self.assertEqual(sorted(lane.task for lane in lanes),
+                         ['switch.tasks.deliver_email_lane'] + ['switch.tasks.deliver_webhook_lane'] * 2)
+        self.assertEqual({settings.CELERY_TASK_ROUTES[lane.task]['queue'] for lane in lanes}, {'email', 'webhooks'})
+        group.return_value.apply_async.assert_called_once()
+        self.assertEqual(switch.deliveries.filter(status='pending').count(), 3)
+
+
+@override_settings(DELIVERY_FANOUT=False, REMINDER_OFFSETS_HOURS=[24, 1])
+class ReminderTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+
+    def make_due_in(self, hours):
+        # A 7 day switch whose deadline is ``hours`` away
+        return make_switch(self.user, days=7, checked_in_days_ago=7 - hours / 24)
+
+    def test_reminds_owner_once_per_offset(self):
+        switch = self.make_due_in(20)
+        self.make_due_in(72)
+
+        send_reminders()
+        send_reminders()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['owner@example.com'])
+        self.assertIn('within 24 hours', mail.outbox[0].subject)
+
+        with mock.patch('switch.tasks.timezone.now', return_value=switch.next_trigger_date - timedelta(minutes=30)):
+            send_reminders()
+            send_reminders()
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('within 1 hour', mail.outbox[1].subject)
+        self.assertEqual(sorted(switch.reminders.values_list('offset_hours', 'status')), [(1, 'delivered'), (24, 'delivered')])
+
+    def test_only_tightest_offset_is_sent(self):
+        self.make_due_in(0.5)
+
+        send_reminders()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(list(Reminder.objects.values_list('offset_hours', flat=True)), [1])
+
+    def test_checkin_allows_reminders_for_the_new_deadline(self):
+        switch = self.make_due_in(20)
+        send_reminders()
+
+        switch.last_checkin = timezone.now() - timedelta(days=6)
+        switch.save()
+        send_reminders()
+
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_reminder_still_queued_is_not_queued_again(self):
+        switch = self.make_due_in(20)
+        with mock.patch('switch.tasks.fan_out'):
+            send_reminders()
+        self.assertEqual(list(switch.reminders.values_list('offset_hours', 'status')), [(24, 'pending')])
+
+        with mock.patch('switch.tasks.timezone.now', return_value=switch.next_trigger_date - timedelta(minutes=30)), \
+                mock.patch('switch.tasks.fan_out') as fan_out:
+            send_reminders()
+
+        (lane, ids), = fan_out.call_args.args[0]
+        self.assertEqual(list(Reminder.objects.filter(id__in=ids).values_list('offset_hours', flat=True)), [1])
+
+
+class IdempotencyTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def create_switch(self, key, title='Vault'):
+        return self.client.post('/api/switches/', {
+            'title': title, 'message': 'Goodbye', 'inactivity_duration_days': 1,
+            'action_type': 'email', 'action_target': 'to@example.com',
+        }, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key, **self.auth)
+
+    def test_retried_create_is_replayed(self):
+        first = self.create_switch('abc')
+        cache.clear()  # the stored response must survive losing the cache
+        second = self.create_switch('abc')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Switch.objects.count(), 1)
+
+        self.assertEqual(self.create_switch('def').status_code, 201)
+        self.assertEqual(Switch.objects.count(), 2)
+
+    def test_response_stored_before_the_lock_is_taken_is_replayed(self):
+        first = self.create_switch('abc')
+        lookups = []
+
+        def stored(scope):
+            # The retry looks before the first request has stored its response
+            lookups.append(scope)
+            return None if len(lookups) == 1 else real_stored(scope)
+
+        real_stored = idempotency._stored
+        with mock.patch('switch.idempotency._stored', side_effect=stored):
+            second = self.create_switch('abc')
+
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Switch.objects.count(), 1)
+
+    def test_reused_key_with_different_body_is_rejected(self):
+        self.create_switch('abc')
+
+        self.assertEqual(self.create_switch('abc', title='Other').status_code, 422)
+        self.assertEqual(Switch.objects.count(), 1)
+
+    def test_expired_keys_are_purged(self):
+        self.create_switch('abc')
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        purge_idempotency_keys()
+
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(DELIVERY_FANOUT=False)
+    def test_deliveries_are_keyed_by_trigger_generation(self):
+        switch = make_switch(self.user, days=1, checked_in_days_ago=2)
+        action = switch.actions.get()
+
+        with mock.patch('requests.post'):
+            check_switches()
+        # Re-running a sweep over the same trigger adds nothing
+        Switch.objects.filter(id=switch.id).update(status='active', generation=0)
+        check_switches()
+
+        self.assertEqual(list(switch.deliveries.values_list('idempotency_key', flat=True)),
+                         [Delivery.key_for(switch.id, 1, action.id)])
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class SwitchPayloadTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def test_message_is_stored_compressed_outside_the_switch(self):
+        message = 'Instructions. ' * 500
+        switch = make_switch(self.user, message=message)
+
+        payload = SwitchPayload.objects.get(switch=switch)
+        self.assertLess(len(payload.data), len(message) // 10)
+        self.assertEqual(Switch.objects.get(id=switch.id).message, message)
+
+    def test_message_is_only_loaded_when_read(self):
+        switch = make_switch(self.user, message='Goodbye')
+        switch = Switch.objects.get(id=switch.id)
+
+        with self.assertNumQueries(1):
+            switch.last_checkin = timezone.now()
+            switch.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(switch.message, 'Goodbye')
+
+        switch.message = 'Farewell'
+        switch.save()
+        self.assertEqual(Switch.objects.get(id=switch.id).message, 'Farewell')
+
+    def test_only_detail_view_returns_message(self):
+        switch = make_switch(self.user, message='Goodbye')
+
+        listed = self.client.get('/api/switches/', **self.auth).json()[0]
+        detail = self.client.get(f'/api/switches/{switch.id}/', **self.auth).json()
+
+        self.assertNotIn('message', listed)
+        self.assertEqual(detail['message'], 'Goodbye')
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.switch = make_switch(self.user, title='Vault', message='Goodbye, "world"')
+        CheckIn.objects.bulk_create(CheckIn(switch=self.switch) for _ in range(5))
+        make_switch(User.objects.create_user(username='other'))
+
+    def export(self, name, **headers):
+        return self.client.get(f'/api/export/{name}', **self.auth, **headers)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_ndjson_export_streams_only_own_rows(self):
+        response = self.export('checkins.ndjson')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['switch_id'] for row in rows}, {self.switch.id})
+
+    def test_csv_export_includes_messages(self):
+        response = self.export('switches.csv')
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,title,status,inactivity_duration_days,last_checkin,next_trigger_date,created_at,message')
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith(',"Goodbye, ""world"""'))
+
+    def test_export_is_gzipped_on_request(self):
+        response = self.export('checkins.csv', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+
+    def test_unknown_export_is_not_found(self):
+        self.assertEqual(self.export('users.csv').status_code, 404)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_pages_do_not_skip_checkins_with_the_same_timestamp(self):
+        timestamp = timezone.now()
+        CheckIn.objects.bulk_create(CheckIn(switch=self.switch, timestamp=timestamp) for _ in range(3))
+        switch = make_switch(self.user, title='Second')
+        CheckIn.objects.create(switch=switch, timestamp=timestamp)
+
+        lines = b''.join(self.export('checkins.csv').streaming_content).decode().splitlines()
+
+        self.assertEqual(len(lines), 10)
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], [str(self.switch.id)] * 8 + [str(switch.id)])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_asgi_export_streams_an_async_iterator(self):
+        is_async, chunks = self.export_async('checkins.ndjson')
+
+        self.assertTrue(is_async)
+        self.assertEqual(len(b''.join(chunks).decode().splitlines()), 5)
+
+    @async_to_sync
+    async def export_async(self, name):
+        response = await self.async_client.get(f'/api/export/{name}', headers={'Authorization': self.auth['HTTP_AUTHORIZATION']})
+        return response.is_async, [chunk async for chunk in response.streaming_content]
+
+
+class CheckInHistoryTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.switch = make_switch(self.user)
+        self.midnight = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=3)
+        # Three days ago: two in the first hour, one in the second; two days ago: one
+        CheckIn.objects.bulk_create(CheckIn(switch=self.switch, timestamp=self.midnight + offset) for offset in (
+            timedelta(minutes=5), timedelta(minutes=10), timedelta(hours=1, minutes=5), timedelta(days=1, hours=3),
+        ))
+
+    def history(self, **params):
+        response = self.client.get(f'/api/switches/{self.switch.id}/checkins/', params, **self.auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_follow_the_cursor(self):
+        first = self.history(limit=3, start=self.midnight.isoformat())
+        second = self.history(limit=3, start=self.midnight.isoformat(), cursor=first['next_cursor'])
+
+        self.assertEqual(len(first['results']), 3)
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(first['results'] + second['results'],
+                         sorted(first['results'] + second['results']))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(f'/api/switches/{self.switch.id}/checkins/', {'cursor': 'nope'}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_hour_buckets(self):
+        counts = [row['count'] for row in self.history(bucket='hour', start=self.midnight.isoformat())['results']]
+        self.assertEqual(counts, [2, 1, 1])
+
+    def test_day_buckets_use_rollups_and_recent_raw_rows(self):
+        with mock.patch('switch.tasks.timezone.now', return_value=self.midnight + timedelta(days=1, hours=12)):
+            rollup_checkins()
+        # Days already rolled up are served from the rollup, so late rows for them are not counted
+        CheckIn.objects.create(switch=self.switch, timestamp=self.midnight + timedelta(hours=2))
+        CheckIn.objects.create(switch=self.switch, timestamp=self.midnight + timedelta(days=1, hours=4))
+
+        self.assertEqual(CheckInDaily.objects.get().count, 3)
+        results = self.history(bucket='day', start=self.midnight.isoformat())['results']
+        self.assertEqual([row['count'] for row in results], [3, 2])
+
+        rollup_checkins()
+
+        results = self.history(bucket='day', start=self.midnight.isoformat())['results']
+        self.assertEqual([row['count'] for row in results], [3, 2])
+        self.assertEqual(sorted(CheckInDaily.objects.values_list('count', flat=True)), [2, 3])
+
+    @override_settings(CHECKIN_ROLLUP_MAX_DAYS=2)
+    def test_rollups_advance_past_days_without_checkins(self):
+        CheckIn.objects.all().delete()
+        CheckIn.objects.create(switch=self.switch, timestamp=self.midnight - timedelta(days=10))
+
+        # 13 days to catch up on, 2 per run
+        for _ in range(7):
+            rollup_checkins()
+
+        self.assertEqual(rolled_up_until(), self.midnight + timedelta(days=3))
+        self.assertEqual(CheckInDaily.objects.count(), 1)
+
+
+@override_settings(DELIVERY_FANOUT=False, ARCHIVE_AFTER_DAYS=30, ARCHIVE_BATCH_SIZE=2)
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def make_triggered(self, days_ago, **kwargs):
+        switch = make_switch(self.user, days=1, checked_in_days_ago=days_ago + 1, **kwargs)
+        CheckIn.objects.bulk_create(CheckIn(switch=switch, timestamp=switch.last_checkin) for _ in range(2))
+        with mock.patch('switch.tasks.timezone.now', return_value=timezone.now() - timedelta(days=days_ago)):
+            check_switches()
+        return switch
+
+    def test_old_triggered_switches_move_to_archive(self):
+        old = [self.make_triggered(40, message=f'Old {index}') for index in range(3)]
+        recent = self.make_triggered(5)
+        active = make_switch(self.user)
+
+        archive_switches()
+
+        self.assertEqual(set(Switch.objects.values_list('id', flat=True)), {recent.id, active.id})
+        self.assertEqual(set(ArchivedSwitch.objects.values_list('id', flat=True)), {switch.id for switch in old})
+        self.assertEqual(ArchivedCheckIn.objects.count(), 6)
+        self.assertFalse(Action.objects.filter(switch_id__in=[switch.id for switch in old]).exists())
+        self.assertEqual(ArchivedSwitch.objects.get(id=old[0].id).message, 'Old 0')
+
+    def test_archived_switches_are_readable(self):
+        switch = self.make_triggered(40, message='Goodbye')
+        archive_switches()
+
+        listed = self.client.get('/api/archived-switches/', **self.auth).json()
+        detail = self.client.get(f'/api/archived-switches/{switch.id}/', **self.auth).json()
+        checkins = self.client.get(f'/api/archived-switches/{switch.id}/checkins/', **self.auth).json()
+
+        self.assertEqual([row['id'] for row in listed], [switch.id])
+        self.assertNotIn('message', listed[0])
+        self.assertEqual(detail['message'], 'Goodbye')
+        self.assertEqual(detail['actions'], [{'type': 'email', 'target': 'to@example.com', 'batch_deliveries': False}])
+        self.assertEqual(len(checkins['results']), 2)
+        self.assertEqual(self.client.get(f'/api/switches/{switch.id}/', **self.auth).status_code, 404)
+
+
+@override_settings(PUSH_BROKER_URL='', PUSH_HEARTBEAT_SECONDS=60, DELIVERY_FANOUT=False)
+class PushTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        push.broker.cache_clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+
+    def stream(self, query_string, publish_user_id=None):
+        """Run the event stream until one event (or the response) arrives; returns what was sent"""
+        async def run():
+            sent, disconnect = [], asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if message.get('body', b'').startswith(b'event:'):
+                    disconnect.set()
+
+            scope = {'type': 'http', 'path': push.EVENTS_PATH, 'query_string': query_string.encode(), 'headers': []}
+            app = asyncio.ensure_future(push.events_app(scope, receive, send))
+            while publish_user_id is not None and not push.broker().subscribers:
+                await asyncio.sleep(0.01)
+            if publish_user_id is not None:
+                push.publish(publish_user_id, 'switch.checkin', switch_id=7)
+                push.publish(publish_user_id + 1, 'switch.checkin', switch_id=8)
+            await asyncio.wait_for(app, 5)
+            return sent
+
+        return asyncio.run(run())
+
+    def test_stream_receives_own_events(self):
+        sent = self.stream(f'token={AccessToken.for_user(self.user)}', publish_user_id=self.user.id)
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        events = [message['body'] for message in sent[1:] if message.get('body', b'').startswith(b'event:')]
+        self.assertEqual(len(events), 1)
+        self.assertTrue(events[0].startswith(b'event: switch.checkin\ndata: '))
+        self.assertEqual(json.loads(events[0].split(b'data: ')[1])['switch_id'], 7)
+        self.assertFalse(push.broker().subscribers)
+
+    def test_stream_requires_a_valid_token(self):
+        self.assertEqual(self.stream('token=nope')[0]['status'], 401)
+        self.assertEqual(self.stream('')[0]['status'], 401)
+
+    def test_checkin_trigger_and_delivery_are_published(self):
+        switch = make_switch(self.user, days=1, checked_in_days_ago=2)
+
+        with mock.patch('dms.push.publish') as publish:
+            check_switches()
+            self.client.post(f'/api/switches/{switch.id}/checkin/',
+                             HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+        self.assertEqual([call.args for call in publish.call_args_list], [
+            (self.user.id, 'switch.triggered'),
+            (self.user.id, 'delivery.completed'),
+            (self.user.id, 'switch.checkin'),
+        ])
+        self.assertEqual(publish.call_args_list[1].kwargs['status'], 'delivered')
+
+
+class SparseFieldsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.switch = make_switch(self.user, message='Goodbye')
+
+    def test_list_returns_and_selects_only_requested_fields(self):
+        with self.assertNumQueries(2):  # auth + switches, no actions prefetch
+            response = self.client.get('/api/switches/', {'fields': 'id,status,next_trigger_date'}, **self.auth)
+
+        self.assertEqual(list(response.json()[0]), ['id', 'status', 'next_trigger_date'])
+
+    def test_detail_message_can_be_requested(self):
+        response = self.client.get(f'/api/switches/{self.switch.id}/', {'fields': 'id,message'}, **self.auth)
+        self.assertEqual(response.json(), {'id': self.switch.id, 'message': 'Goodbye'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/switches/', {'fields': 'id,secret'}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        push.broker.cache_clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        # The async client takes headers rather than WSGI environ keys
+        self.headers = {'Authorization': self.auth['HTTP_AUTHORIZATION']}
+        self.switch = make_switch(self.user, message='Goodbye')
+
+    async def test_list_matches_drf_list(self):
+        response = await self.async_client.get('/api/async/switches/', headers=self.headers)
+        expected = await sync_to_async(self.client.get)('/api/switches/', **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_detail_includes_message_and_hides_other_users_switches(self):
+        other = await User.objects.acreate(username='other')
+        other_switch = await sync_to_async(make_switch)(other)
+
+        response = await self.async_client.get(f'/api/async/switches/{self.switch.id}/', headers=self.headers)
+        self.assertEqual(response.json()['message'], 'Goodbye')
+        response = await self.async_client.get(f'/api/async/switches/{other_switch.id}/', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_checkin_resets_switch(self):
+        before = self.switch.last_checkin
+
+        response = await self.async_client.post(f'/api/async/switches/{self.switch.id}/checkin/', headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        await self.switch.arefresh_from_db()
+        self.assertGreater(self.switch.last_checkin, before)
+        self.assertEqual(await CheckIn.objects.filter(switch=self.switch).acount(), 1)
+
+    async def test_user_status(self):
+        response = await self.async_client.get('/api/async/my-status/', headers=self.headers)
+        self.assertEqual(response.json()['active_switches'], 1)
+        self.assertEqual(response.json()['triggered_switches'], 0)
+
+    async def test_requires_token(self):
+        response = await self.async_client.get('/api/async/switches/')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(PROFILER_ENABLED=True)
+    async def test_profiler_runs_in_the_async_chain(self):
+        async def view(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(RequestProfilerMiddleware(view)))
+
+        response = await self.async_client.get('/api/async/my-status/', headers=self.headers)
+
+        # The token's user and the aggregate, run in the ORM's thread
+        self.assertIn('queries;desc="2"', response['Server-Timing'])
+        self.assertIn('view;dur=', response['Server-Timing'])
+
+    async def test_sparse_fields(self):
+        response = await self.async_client.get('/api/async/switches/', {'fields': 'id,status'}, headers=self.headers)
+        self.assertEqual(response.json(), [{'id': self.switch.id, 'status': 'active'}])
+        response = await self.async_client.get('/api/async/switches/', {'fields': 'id,secret'}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class CompressionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        make_switch(self.user)
+
+    def list_switches(self, encoding):
+        return self.client.get('/api/switches/', HTTP_ACCEPT_ENCODING=encoding, **self.auth)
+
+    def test_small_responses_are_not_compressed(self):
+        self.assertFalse(self.list_switches('gzip').has_header('Content-Encoding'))
+
+    def test_large_responses_are_gzipped(self):
+        for _ in range(20):
+            make_switch(self.user)
+
+        response = self.list_switches('gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 21)
+
+    def test_brotli_is_preferred_when_available(self):
+        for _ in range(20):
+            make_switch(self.user)
+        fake = mock.Mock(compress=mock.Mock(return_value=b'brotli'))
+
+        with mock.patch('dms.compression.brotli', fake):
+            response = self.list_switches('gzip, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response.content, b'brotli')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+
+class DatabaseConfigTestCase(TestCase):
+    def config(self, **env):
+        with mock.patch.dict(os.environ, env, clear=True):
+            return database_config(settings.BASE_DIR)
+
+    def replicas(self, primary, **env):
+        with mock.patch.dict(os.environ, env, clear=True):
+            return replica_configs(primary)
+
+    def test_postgresql_profile_reads_credentials_and_connection_policy(self):
+        config = self.config(
+            DB_ENGINE='PostgreSQL', DB_NAME='dms', DB_USER='app', DB_PASSWORD='secret', DB_HOST='db',
+            DB_CONN_MAX_AGE='0', DB_CONN_HEALTH_CHECKS='off',
+        )
+
+        self.assertEqual(config, {
+            'ENGINE': 'django.db.backends.postgresql', 'NAME': 'dms', 'USER': 'app', 'PASSWORD': 'secret',
+            'HOST': 'db', 'PORT': '5432', 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+        })
+
+    def test_defaults_keep_connections_for_a_minute_with_health_checks(self):
+        config = self.config(DB_ENGINE='postgresql')
+
+        self.assertEqual((config['HOST'], config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), ('localhost', 60, True))
+
+    def test_sqlite_profile_keeps_connections_forever(self):
+        config = self.config(DB_ENGINE='sqlite')
+
+        self.assertEqual(config['NAME'], str(settings.BASE_DIR / 'db.sqlite3'))
+        self.assertIsNone(config['CONN_MAX_AGE'])
+        self.assertEqual(self.config(DB_ENGINE='sqlite', DB_CONN_MAX_AGE='30')['CONN_MAX_AGE'], 30)
+
+    def test_conn_max_age_none_means_forever(self):
+        self.assertIsNone(self.config(DB_ENGINE='postgresql', DB_CONN_MAX_AGE=' None ')['CONN_MAX_AGE'])
+
+    def test_unknown_engine_is_rejected(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, "DB_ENGINE must be one of mysql, postgresql, sqlite, not 'oracle'"):
+            self.config(DB_ENGINE='oracle')
+
+    def test_invalid_conn_max_age_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.config(DB_ENGINE='postgresql', DB_CONN_MAX_AGE='forever')
+
+    def test_replicas_copy_the_primary_with_their_own_host(self):
+        primary = self.config(DB_ENGINE='postgresql', DB_NAME='dms', DB_HOST='db')
+
+        replicas = self.replicas(primary, DB_REPLICA_HOSTS=' replica-a, ,replica-b ')
+
+        self.assertEqual(sorted(replicas), ['replica_0', 'replica_1'])
+        self.assertEqual(replicas['replica_1'], {**primary, 'HOST': 'replica-b', 'TEST': {'MIRROR': 'default'}})
+        self.assertEqual(self.replicas(primary), {})
+
+    def test_sqlite_profile_rejects_replicas(self):
+        primary = self.config(DB_ENGINE='sqlite')
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.replicas(primary, DB_REPLICA_HOSTS='replica-a')
+
+
+class MetricsTestCase(TestCase):
+    def test_metrics_endpoint_hidden_when_disabled(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 404)
+
+
+class RequestProfilerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        make_switch(self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    @override_settings(PROFILER_ENABLED=True)
+    def test_server_timing_header(self):
+        response = self.client.get('/api/switches/', **self.auth)
+        timing = response['Server-Timing']
+        for name in ('total;dur=', 'db;dur=', 'serializer;dur=', 'view;dur=', 'queries;desc='):
+            self.assertIn(name, timing)
+
+    def test_no_header_when_disabled(self):
+        response = self.client.get('/api/switches/', **self.auth)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_authorized_header_writes_profile(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            with override_settings(PROFILER_ENABLED=True, PROFILER_HEADER_TOKEN='secret', PROFILER_OUTPUT_DIR=output_dir):
+                self.client.get('/api/switches/', HTTP_X_PROFILE='wrong', **self.auth)
+                self.assertEqual(os.listdir(output_dir), [])
+                self.client.get('/api/switches/', HTTP_X_PROFILE='secret', **self.auth)
+                self.assertEqual(len(os.listdir(output_dir)), 1)
+
+
+class SeedCommandTestCase(TestCase):
+    def test_seed_dms_creates_consistent_rows(self):
+        User.objects.create_user(username='existing', email='existing@example.com', password='pw')
+        call_command('seed_dms', users=20, switches_per_user=2, checkins_per_switch=3,
+                     batch_size=7, seed=1, stdout=StringIO())
+
+        self.assertEqual(User.objects.count(), 21)
+        self.assertEqual(Switch.objects.count(), 40)
+        self.assertEqual(Action.objects.count(), 40)
+        self.assertTrue(CheckIn.objects.exists())
+        for switch in Switch.objects.all():
+            self.assertEqual(switch.next_trigger_date, switch.compute_next_trigger_date())
+        seeded = User.objects.exclude(username='existing').first()
+        self.assertTrue(seeded.check_password('seed-password-123'))
+
+
+@override_settings(WEBHOOK_CIRCUIT_FAILURE_THRESHOLD=2, WEBHOOK_CIRCUIT_RESET_SECONDS=30, DELIVERY_FANOUT=False)
+class WebhookCircuitTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        self.hook = 'https://down.example.com/hook'
+
+    def test_open_circuit_fails_fast_into_retry(self):
+        for _ in range(3):
+            make_switch(self.user, days=1, checked_in_days_ago=2, action_type='webhook', target=self.hook)
+
+        with mock.patch('requests.post', side_effect=ConnectionError) as post, \
+                mock.patch('switch.tasks.deliver_webhook_lane.apply_async') as retry:
+            check_switches()
+
+        # The third delivery never reached the network
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(retry.call_count, 3)
+        self.assertEqual(retry.call_args.kwargs['countdown'], 60)
+        self.assertEqual(breaker_for(self.hook).state(), OPEN)
+        self.assertEqual(Switch.objects.filter(status='triggered').count(), 3)
+
+    def test_intermittent_failures_trip_the_circuit(self):
+        breaker = breaker_for(self.hook)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state(), OPEN)
+
+    def test_half_open_probe_closes_circuit(self):
+        breaker = breaker_for(self.hook)
+        breaker.trip()
+        self.assertFalse(breaker.allow())
+
+        with mock.patch('switch.circuit.time.time', return_value=time.time() + 31):
+            self.assertEqual(breaker.state(), HALF_OPEN)
+            self.assertTrue(breaker.allow())
+            # Only one probe is let through per reset period
+            self.assertFalse(breaker.allow())
+            breaker.record_success()
+
+        self.assertEqual(breaker.state(), CLOSED)
+
+    def test_state_endpoint_lists_users_webhook_hosts(self):
+        make_switch(self.user, action_type='webhook', target=self.hook)
+        make_switch(self.user, action_type='webhook', target='https://up.example.com/hook')
+        breaker_for(self.hook).trip()
+
+        response = self.client.get('/api/webhook-circuits/',
+                                   HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+        self.assertEqual(response.json(), [
+            {'host': 'down.example.com', 'state': OPEN, 'recent_failures': 0},
+            {'host': 'up.example.com', 'state': CLOSED, 'recent_failures': 0},
+        ])
+
+
+class SweepSimulationTestCase(TestCase):
+    def test_simulated_sweeps_deliver_to_sinks(self):
+        user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+        make_switch(user, days=1, checked_in_days_ago=0)
+        make_switch(user, days=1, checked_in_days_ago=0, action_type='webhook', target='https://example.com/hook')
+        make_switch(user, days=30, checked_in_days_ago=0)
+
+        report = run_simulation(hours=30, step=timedelta(hours=6))
+
+        summary = report['summary']
+        self.assertEqual(summary['triggered'], 2)
+        self.assertEqual((summary['emails'], summary['webhooks']), (1, 1))
+        self.assertGreaterEqual(summary['lateness_p50_s'], 0)
+        self.assertLessEqual(summary['lateness_max_s'], 6 * 3600 + 60)
+
+
+class SingleProcessChecksTestCase(TestCase):
+    def test_warns_about_a_per_process_cache(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['switch.W001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_warns_about_a_per_process_push_broker(self):
+        with override_settings(PUSH_BROKER_URL=''):
+            self.assertEqual([warning.id for warning in check_push_broker(None)], ['switch.W002'])
+        with override_settings(PUSH_BROKER_URL='redis://localhost:6379/0'):
+            self.assertEqual(check_push_broker(None), [])
+
+
+# Not wrapped in a test transaction, which would pin every read to the primary
+@override_settings(DELIVERY_FANOUT=False, REMINDER_OFFSETS_HOURS=[24])
+class ReplicaLagTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pw')
+
+    def test_tasks_read_rows_they_just_wrote_from_the_primary(self):
+        make_switch(self.user, days=1, checked_in_days_ago=2)
+        make_switch(self.user, days=1, checked_in_days_ago=0.5)
+
+        with lagging_replica('switch_delivery', 'switch_reminder'):
+            check_switches()
+            send_reminders()
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Delivery.objects.get().status, 'delivered')
+        self.assertEqual(Reminder.objects.get().status, 'delivered')
+
+    @override_settings(ARCHIVE_AFTER_DAYS=30)
+    def test_archive_reads_actions_and_checkins_from_the_primary(self):
+        switch = make_switch(self.user, days=1, checked_in_days_ago=41)
+        CheckIn.objects.bulk_create(CheckIn(switch=switch, timestamp=switch.last_checkin) for _ in range(2))
+        Switch.objects.filter(id=switch.id).update(status='triggered', triggered_at=timezone.now() - timedelta(days=40))
+
+        with lagging_replica('switch_action', 'switch_checkin'):
+            archive_switches()
+
+        self.assertEqual(ArchivedSwitch.objects.get().actions.count(), 1)
+        self.assertEqual(ArchivedCheckIn.objects.count(), 2)
+
+
+@mock.patch('dms.routers.replica_aliases', return_value=['replica_0'])
+class ReplicaRoutingTestCase(TransactionTestCase):
+    def test_reads_use_replica_unless_pinned(self, replicas):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Switch), 'replica_0')
+        self.assertEqual(router.db_for_write(Switch), 'default')
+        with use_primary():
+            self.assertEqual(router.db_for_read(Switch), 'default')
+
+    def test_reads_in_a_transaction_or_from_primary_rows_use_primary(self, replicas):
+        router = PrimaryReplicaRouter()
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Delivery), 'default')
+
+        switch = Switch(id=1)
+        switch._state.db = 'default'
+        self.assertEqual(router.db_for_read(Action, instance=switch), 'default')
+        switch._state.db = 'replica_0'
+        self.assertEqual(router.db_for_read(Action, instance=switch), 'replica_0')
+
+    def test_client_reads_stick_to_primary_after_a_write(self, replicas):
+        cache.clear()
+        routed = []
+        middleware = ReplicaStickinessMiddleware(lambda request: routed.append(replica_alias()) or HttpResponse())
+        factory = RequestFactory()
+
+        middleware(factory.get('/api/my-status/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.post('/api/switches/1/checkin/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.get('/api/my-status/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.get('/api/my-status/', HTTP_AUTHORIZATION='Bearer b'))
+
+        self.assertEqual(routed, ['replica_0', 'default', 'default', 'replica_0'])
+
+    async def test_async_requests_stick_to_primary_after_a_write(self, replicas):
+        await cache.aclear()
+        routed = []
+
+        async def view(request):
+            routed.append(replica_alias())
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = AsyncRequestFactory()
+
+        await middleware(factory.get('/api/async/my-status/', headers={'Authorization': 'Bearer a'}))
+        await middleware(factory.post('/api/async/switches/1/checkin/', headers={'Authorization': 'Bearer a'}))
+        await middleware(factory.get('/api/async/my-status/', headers={'Authorization': 'Bearer a'}))
+
+        self.assertEqual(routed, ['replica_0', 'default', 'default'])
+
+
+class EventLogTestCase(TestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        self.handler = QueueingHandler(stream=self.stream)
+        events_logger.addHandler(self.handler)
+        self.addCleanup(events_logger.removeHandler, self.handler)
+        self.addCleanup(self.handler.close)
+
+    def lines(self):
+        self.handler.flush()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_events_are_written_as_json_with_lazy_fields(self):
+        log_event('delivery.attempt', switch_id=7, error=ValueError('boom'), detail=lambda: 'computed')
+
+        line = [l for l in self.lines() if l['event'] == 'delivery.attempt'][-1]
+        self.assertEqual(line['switch_id'], 7)
+        self.assertEqual(line['error'], 'boom')
+        self.assertEqual(line['detail'], 'computed')
+
+    @override_settings(LOG_EVENT_SAMPLE_RATES={'switch': 0.0})
+    def test_sampled_out_events_are_never_evaluated(self):
+        evaluated = mock.Mock(return_value='x')
+        log_event('switch.checkin', switch_id=1, detail=evaluated)
+
+        self.assertEqual([l for l in self.lines() if l.get('event') == 'switch.checkin'], [])
+        evaluated.assert_not_called()
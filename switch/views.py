@@ -2,38 +2,66 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action,api_view, permission_classes
 from rest_framework.response import Response
 from django.utils import timezone
-from .models import Switch, Action, ActionType,CheckIn
+from .models import Switch, Action, ActionType,CheckIn,ArchivedSwitch
 from .serializers import (
     SwitchCreateSerializer,
     SwitchResponseSerializer,
-    ActionTypeSerializer
+    SwitchDetailSerializer,
+    ActionTypeSerializer,
+    DeliverySerializer,
+    CheckInHistoryQuerySerializer,
+    ArchivedSwitchSerializer,
+    ArchivedSwitchDetailSerializer
 )
-from django.db.models import Max
+from django.db.models import Count, Max, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404
 import requests
 from rest_framework.views import APIView
+from dms import metrics, push
+from dms.fieldsets import model_columns, requested_fields, wants_any
+from dms.eventlog import log_event
+from .circuit import breaker_for
+from .export import ENCODERS, EXPORTS, export_response
+from . import history
+from .idempotency import IdempotentCreateMixin, idempotent
 
 
 
-class SwitchViewSet(viewsets.ModelViewSet):
+def switch_queryset(request, user, action, serializer_class):
+    """The user's switches, loading only what ``action`` renders with ``serializer_class``"""
+    queryset = Switch.objects.filter(user=user)
+    # Check-ins never load actions, so their cost does not grow with them
+    if action in ('list', 'retrieve', 'partial_update', 'update') and wants_any(request, 'actions', 'action_type'):
+        queryset = queryset.prefetch_related('actions')
+    # Only the detail view shows the message
+    if action == 'retrieve' and wants_any(request, 'message'):
+        queryset = queryset.select_related('payload')
+    fields = requested_fields(request)
+    if fields is not None and action in ('list', 'retrieve'):
+        columns = model_columns(serializer_class, fields)
+        if action == 'retrieve' and 'message' in fields:
+            columns.add('payload__data')
+        queryset = queryset.only(*columns)
+    return queryset
+
+
+class SwitchViewSet(IdempotentCreateMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = Switch.objects.all()
 
     def get_serializer_class(self):
         if self.action == 'create':
             return SwitchCreateSerializer
+        if self.action == 'retrieve':
+            return SwitchDetailSerializer
         return SwitchResponseSerializer
 
     def perform_create(self, serializer):
-        # Create associated action first
-        action_data = {
-            'type': self.request.data.get('action_type'),
-            'target': self.request.data.get('action_target')
-        }
-        action = Action.objects.create(**action_data)
-        serializer.save(user=self.request.user, action=action)
+        serializer.save(user=self.request.user)
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        return switch_queryset(self.request, self.request.user, self.action, self.get_serializer_class())
     
     def partial_update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -44,15 +72,47 @@ class SwitchViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def checkin(self, request, pk=None):
+        return idempotent(request, lambda: self._checkin(request))
+
+    def _checkin(self, request):
         switch = self.get_object()
         switch.last_checkin = timezone.now()
         switch.save()
         CheckIn.objects.create(switch=switch)
+        metrics.CHECKINS.inc()
+        log_event('switch.checkin', switch_id=switch.id, user_id=request.user.id)
+        push.publish(request.user.id, 'switch.checkin', switch_id=switch.id,
+                     last_checkin=switch.last_checkin, next_trigger_date=switch.next_trigger_date)
         return Response(
             {"message": "Check-in successful. Next trigger reset."},
             status=status.HTTP_200_OK
         )
 
+    @action(detail=True, methods=['get'])
+    def deliveries(self, request, pk=None):
+        switch = self.get_object()
+        deliveries = switch.deliveries.select_related('action').order_by('-created_at', 'id')
+        return Response(DeliverySerializer(deliveries, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def checkins(self, request, pk=None):
+        switch = self.get_object()
+        query = CheckInHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end = query.validated_data['start'], query.validated_data['end']
+
+        bucket = query.validated_data.get('bucket')
+        if bucket:
+            counts = history.histogram(switch, start, end, bucket)
+            return Response({
+                'bucket': bucket,
+                'start': start,
+                'end': end,
+                'results': [{'start': bucket_start, 'count': count} for bucket_start, count in counts],
+            })
+
+        return checkin_page(switch.checkins.all(), query.validated_data)
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def webhook_test(request):
@@ -75,6 +135,41 @@ def webhook_test(request):
         return Response({'error': str(e)}, status=400)
     
 
+def checkin_page(checkins, query):
+    timestamps, next_cursor = history.page(
+        checkins, query['start'], query['end'], query['limit'], query.get('cursor'),
+    )
+    return Response({'results': timestamps, 'next_cursor': next_cursor})
+
+
+class ArchivedSwitchViewSet(viewsets.ReadOnlyModelViewSet):
+    """Switches moved to the archive by ``archive_switches``, looked up by their original id"""
+    permission_classes = [permissions.IsAuthenticated]
+    queryset = ArchivedSwitch.objects.all()
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return ArchivedSwitchDetailSerializer
+        return ArchivedSwitchSerializer
+
+    def get_queryset(self):
+        queryset = self.queryset.filter(user=self.request.user).order_by('-triggered_at', '-id')
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.prefetch_related('actions')
+        # The message is only returned by the detail view
+        if self.action != 'retrieve':
+            queryset = queryset.defer('data')
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def checkins(self, request, pk=None):
+        switch = self.get_object()
+        # Archived check-ins are only paged; they have no rollups to bucket them with
+        query = CheckInHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return checkin_page(switch.checkins.all(), query.validated_data)
+
+
 class ActionViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -90,16 +185,43 @@ class UserStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        switches = request.user.switches.all()
-        last_checkin = switches.aggregate(
-            last=Max('last_checkin')
-        )['last']
+        summary = request.user.switches.aggregate(
+            last=Max('last_checkin'),
+            active=Count('id', filter=Q(status='active')),
+            triggered=Count('id', filter=Q(status='triggered')),
+        )
+        last_checkin = summary['last']
 
         if last_checkin is not None:
             last_checkin = last_checkin.strftime("%Y-%m-%d %H:%M:%S")
         
         return Response({
-            'active_switches': switches.filter(status='active').count(),
-            'triggered_switches': switches.filter(status='triggered').count(),
+            'active_switches': summary['active'],
+            'triggered_switches': summary['triggered'],
             'last_checkin': last_checkin
         })
+
+class WebhookCircuitView(APIView):
+    """Circuit breaker state for the hosts of the user's webhook actions"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        targets = Action.objects.filter(switch__user=request.user, type='webhook').values_list('target', flat=True)
+        breakers = {}
+        for target in targets:
+            breaker = breaker_for(target)
+            breakers.setdefault(breaker.host, breaker)
+        return Response([
+            {'host': host, 'state': breaker.state(), 'recent_failures': breaker.failures()}
+            for host, breaker in sorted(breakers.items())
+        ])
+
+
+class ExportView(APIView):
+    """Streams the user's switches or check-in history as NDJSON or CSV"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, resource, fmt):
+        if resource not in EXPORTS or fmt not in ENCODERS:
+            raise Http404
+        return export_response(request.user, resource, fmt, asynchronous=isinstance(request._request, ASGIRequest))
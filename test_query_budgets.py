@@ -0,0 +1,127 @@
+
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework_simplejwt.tokens import AccessToken
+
+from unittest import mock
+
+from switch.models import Switch, Action, CheckIn
+from switch.tasks import check_switches
+
+
+User = get_user_model()
+
+# Every budget is checked against a small and a large account; the number of
+# queries an endpoint issues must not depend on how much data the user has.
+SMALL, LARGE = 1, 25
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTestCase(APITestCase):
+    def setUp(self):
+        self.accounts = {n: self.create_account(n) for n in (SMALL, LARGE)}
+
+    def create_account(self, n, overdue=False):
+        user = User.objects.create_user(
+            username=f"user{n}{'_overdue' if overdue else ''}",
+            email=f"user{n}{'_overdue' if overdue else ''}@example.com",
+            password="strong_password123"
+        )
+        last_checkin = timezone.now() - timedelta(days=10 if overdue else 0)
+        for i in range(n):
+            switch = Switch.objects.create(
+                user=user,
+                title=f"Switch {i}",
+                message="Goodbye",
+                inactivity_duration_days=7,
+                last_checkin=last_checkin,
+            )
+            Action.objects.bulk_create(
+                Action(switch=switch, type='webhook' if j % 2 else 'email',
+                       target='https://example.com/hook' if j % 2 else 'to@example.com')
+                for j in range(1 + i % 3)
+            )
+            CheckIn.objects.bulk_create(CheckIn(switch=switch) for _ in range(n))
+        return user
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def assertBudget(self, budget, method, url):
+        for n, user in self.accounts.items():
+            with self.subTest(switches=n):
+                self.authenticate(user)
+                switch_pk = user.switches.first().pk
+                with self.assertNumQueries(budget):
+                    response = getattr(self.client, method)(url(switch_pk))
+                self.assertLess(response.status_code, 400, response.content)
+
+    # --- Switch endpoints ---
+
+    def test_list_switches_budget(self):
+        # auth user lookup + switches + their actions in one prefetch
+        self.assertBudget(3, 'get', lambda pk: reverse('switch-list'))
+
+    def test_retrieve_switch_budget(self):
+        # auth + switch + its actions
+        self.assertBudget(3, 'get', lambda pk: reverse('switch-detail', args=[pk]))
+
+    def test_checkin_budget(self):
+        # auth + load switch + update switch + insert check-in; actions are never loaded
+        self.assertBudget(4, 'post', lambda pk: reverse('switch-checkin', args=[pk]))
+
+    def test_checkin_history_budget(self):
+        # auth + switch + one keyset page of check-ins
+        self.assertBudget(3, 'get', lambda pk: reverse('switch-checkins', args=[pk]))
+
+    def test_my_status_budget(self):
+        # auth + a single aggregate over the user's switches
+        self.assertBudget(2, 'get', lambda pk: reverse('user-status'))
+
+    # --- User endpoints ---
+
+    def test_register_budget(self):
+        self.client.credentials()
+        for n in (SMALL, LARGE):
+            with self.subTest(switches=n):
+                # case-insensitive and exact username checks from UserCreationForm + insert
+                with self.assertNumQueries(3):
+                    response = self.client.post(reverse('register-list'), {
+                        "username": f"newuser{n}",
+                        "email": f"newuser{n}@example.com",
+                        "password1": "new_strong_password"
+                    }, format='json')
+                self.assertEqual(response.status_code, 201, response.content)
+
+    def test_login_budget(self):
+        self.client.credentials()
+        for n, user in self.accounts.items():
+            with self.subTest(switches=n):
+                # user lookup (last_login is only updated if SIMPLE_JWT asks for it)
+                with self.assertNumQueries(1):
+                    response = self.client.post(reverse('login-list'), {
+                        "email": user.email,
+                        "password": "strong_password123"
+                    }, format='json')
+                self.assertEqual(response.status_code, 200, response.content)
+
+    # --- Background sweep ---
+
+    @mock.patch('switch.tasks.group')
+    def test_check_switches_budget(self, mock_group):
+        for n in (SMALL, LARGE):
+            with self.subTest(overdue_switches=n):
+                self.create_account(n, overdue=True)
+                # due switches + their actions, then in one transaction (savepoint
+                # and release under the test case) the claiming row lock, a bulk
+                # status update and a bulk delivery insert, then the new delivery
+                # ids for the fan-out
+                with self.assertNumQueries(8):
+                    check_switches()
+                self.assertFalse(Switch.objects.filter(
+                    status='active', next_trigger_date__lte=timezone.now()
+                ).exists())
@@ -7,13 +7,12 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.urls import reverse
-from django.core.mail import send_mail
-from django.conf import settings
+from dms.emails import send_email
+from dms.profiling import ProfiledSerializerMixin
 
 User = get_user_model()
 
-class RegisterationSerializer(serializers.Serializer):
+class RegisterationSerializer(ProfiledSerializerMixin, serializers.Serializer):
     username = serializers.CharField(max_length=150)
     email = serializers.EmailField()
     password1 = serializers.CharField(write_only=True, style={'input_type': 'password'})
@@ -22,7 +21,7 @@ class RegisterationSerializer(serializers.Serializer):
         form = UserForm({
             "username": data.get("username"),
             "email": data.get("email"),
-            "password1": data.get("password"),
+            "password1": data.get("password1"),
         })
         if not form.is_valid():
             raise serializers.ValidationError(form.errors)
@@ -47,7 +46,7 @@ class RegisterationSerializer(serializers.Serializer):
         }
 
 
-class LoginSerializer(TokenObtainPairSerializer):
+class LoginSerializer(ProfiledSerializerMixin, TokenObtainPairSerializer):
     username_field = User.EMAIL_FIELD
 
     def validate(self, attrs):
@@ -71,7 +70,7 @@ class LoginSerializer(TokenObtainPairSerializer):
 
         return data
 
-class PasswordResetSerializer(serializers.Serializer):
+class PasswordResetSerializer(ProfiledSerializerMixin, serializers.Serializer):
     email = serializers.EmailField()
 
     def validate_email(self, value):
@@ -82,39 +81,17 @@ class PasswordResetSerializer(serializers.Serializer):
         return value
 
     def save(self):
-        request = self.context.get('request')
         user = User.objects.get(email=self.validated_data['email'])
         uid = urlsafe_base64_encode(force_bytes(user.pk))
         token = str(AccessToken.for_user(user))
-        reset_link = request.build_absolute_uri(
-            reverse('password-reset-confirm', kwargs={'uid': uid, 'token': token})
-        )
 
-        send_mail(
-            'Password Reset Request',
-            f"""
-            Dear {user.username},
-        
-            We received a request to reset your password for your account associated with this email address. If you did not request this, please ignore this email. No changes have been made to your account.
-        
-            To reset your password, please click the link below or copy and paste it into your browser:
-        
-            http://127.0.0.1:8000/password_reset/{uid}/{token}
-        
-            This link will expire in 1 hour.
-        
-            If you have any questions, feel free to contact our support team.
-        
-            Best regards,
-            The Dead Man Switch Team
-            """,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        send_email('password_reset', {
+            'username': user.username,
+            'reset_url': f"http://127.0.0.1:8000/password_reset/{uid}/{token}",
+        }, [user.email])
 
 
-class PasswordResetConfirmSerializer(serializers.Serializer):
+class PasswordResetConfirmSerializer(ProfiledSerializerMixin, serializers.Serializer):
     new_password = serializers.CharField(write_only=True)
     uid = serializers.CharField(write_only=True)
     token = serializers.CharField(write_only=True)